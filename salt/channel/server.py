@@ -1310,6 +1310,7 @@ class PubServerChannel:
         self.present = {}
         self.presence_events = presence_events
         self.event = salt.utils.event.get_event("master", opts=self.opts, listen=False)
+        self.crypticle = None
 
     @property
     def aes_key(self):
@@ -1317,6 +1318,16 @@ class PubServerChannel:
             return salt.master.SMaster.secrets["cluster_aes"]["secret"].value
         return salt.master.SMaster.secrets["aes"]["secret"].value
 
+    def _aes_crypticle(self):
+        """
+        Return the crypticle for the current AES key, only building a new one
+        when the key has been rotated.
+        """
+        key_string = self.aes_key
+        if self.crypticle is None or self.crypticle.key_string != key_string:
+            self.crypticle = _get_crypticle(self.opts, key_string)
+        return self.crypticle
+
     def __getstate__(self):
         return {
             "opts": self.opts,
@@ -1332,6 +1343,7 @@ class PubServerChannel:
         self.ckminions = salt.utils.minions.CkMinions(self.opts)
         self.present = {}
         self.master_key = salt.crypt.MasterKeys(self.opts)
+        self.crypticle = None
 
     def close(self):
         self.transport.close()
@@ -1383,6 +1395,13 @@ class PubServerChannel:
         if secrets is not None:
             salt.master.SMaster.secrets = secrets
         self.master_key = salt.crypt.MasterKeys(self.opts)
+        # Build the crypticle up front so the first publish doesn't pay for
+        # it. The AES secret may not be set up yet, in which case it is built
+        # lazily on the first publish instead.
+        try:
+            self._aes_crypticle()
+        except KeyError:
+            log.debug("AES secret not available yet, deferring crypticle setup")
         self.transport.publish_daemon(
             self.publish_payload,
             self.presence_callback,
@@ -1395,8 +1414,7 @@ class PubServerChannel:
         if msg["enc"] != "aes":
             # We only accept 'aes' encoded messages for 'id'
             return
-        crypticle = _get_crypticle(self.opts, self.aes_key)
-        load = crypticle.loads(msg["load"])
+        load = self._aes_crypticle().loads(msg["load"])
         load = salt.transport.frame.decode_embedded_strs(load)
         if not self.aes_funcs.verify_minion(load["id"], load["tok"]):
             return
@@ -1471,8 +1489,7 @@ class PubServerChannel:
         payload = {"enc": "aes"}
         if not self.opts.get("cluster_id", None):
             load["serial"] = salt.master.SMaster.get_serial()
-        crypticle = _get_crypticle(self.opts, self.aes_key)
-        payload["load"] = crypticle.dumps(load)
+        payload["load"] = self._aes_crypticle().dumps(load)
         if self.opts["sign_pub_messages"]:
             log.debug("Signing data packet")
             payload["sig_algo"] = self.opts["publish_signing_algorithm"]
@@ -8,11 +8,13 @@ group, mode, and data
 # some time in the future
 
 
+import concurrent.futures
 import datetime
 import errno
 import fnmatch
 import glob
 import hashlib
+import heapq
 import itertools
 import logging
 import mmap
@@ -60,6 +62,18 @@ log = logging.getLogger(__name__)
 
 __func_alias__ = {"makedirs_": "makedirs"}
 
+_IS_WINDOWS = salt.utils.platform.is_windows()
+
+# Timestamp suffix of the backups made by salt.utils.files.backup_minion, which
+# are named "<basename>_<suffix>". ':' is an illegal filesystem path character
+# on Windows, so '-' is used there instead.
+_BACKUP_SUFFIX_FMT = "%a_%b_%d_%H:%M:%S_%f_%Y"
+_WIN_BACKUP_SUFFIX_FMT = "%a_%b_%d_%H-%M-%S_%f_%Y"
+
+# Number of directories diskusage walks on its own before handing the rest of
+# the tree to a thread pool
+_DISKUSAGE_SERIAL_DIRS = 64
+
 
 AttrChanges = namedtuple("AttrChanges", "added,removed")
 
@@ -69,7 +83,7 @@ def __virtual__():
     Only work on POSIX-like systems
     """
     # win_file takes care of windows
-    if salt.utils.platform.is_windows():
+    if _IS_WINDOWS:
         return (
             False,
             "The file execution module cannot be loaded: only available on "
@@ -78,19 +92,52 @@ def __virtual__():
     return True
 
 
-def __clean_tmp(sfn):
+def _is_tmp(sfn):
     """
-    Clean out a template temp file
+    Return whether a file is a template temp file that can be disposed of
     """
     if sfn.startswith(
         os.path.join(tempfile.gettempdir(), salt.utils.files.TEMPFILE_PREFIX)
     ):
         # Don't remove if it exists in file_roots (any saltenv)
         all_roots = itertools.chain.from_iterable(__opts__["file_roots"].values())
-        in_roots = any(sfn.startswith(root) for root in all_roots)
-        # Only clean up files that exist
-        if os.path.exists(sfn) and not in_roots:
-            os.remove(sfn)
+        return not any(sfn.startswith(root) for root in all_roots)
+    return False
+
+
+def __clean_tmp(sfn):
+    """
+    Clean out a template temp file
+    """
+    # Only clean up files that exist
+    if _is_tmp(sfn) and os.path.exists(sfn):
+        os.remove(sfn)
+
+
+def _same_fs(path, dest):
+    """
+    Return whether ``path`` can be renamed into place at ``dest``, i.e. whether
+    it is on the same filesystem as the directory ``dest`` lives in
+    """
+    try:
+        return (
+            os.stat(path).st_dev
+            == os.stat(os.path.dirname(os.path.abspath(dest))).st_dev
+        )
+    except OSError:
+        return False
+
+
+def _commit_file(sfn, dest, backup_mode="", cachedir=""):
+    """
+    Put the contents of ``sfn`` in place at ``dest``. Template temp files on
+    the same filesystem as ``dest`` are renamed into place, anything else is
+    copied.
+    """
+    if _is_tmp(sfn) and _same_fs(sfn, dest):
+        salt.utils.files.replacefile(sfn, dest, backup_mode, cachedir)
+        return
+    salt.utils.files.copyfile(sfn, dest, backup_mode, cachedir)
 
 
 def _error(ret, err_msg):
@@ -759,6 +806,60 @@ def get_hash(path, form="sha256", chunk_size=65536):
     return salt.utils.hashutils.get_hash(os.path.expanduser(path), form, chunk_size)
 
 
+def _copy_and_hash(src, dst, form="sha256", chunk_size=1048576):
+    """
+    Copy ``src`` to ``dst`` and return the hash sum of the copied data. The
+    source is only read once, the hash is computed while copying.
+    """
+    hasher = hashlib.new(form)
+    with salt.utils.files.fopen(src, "rb") as ifile, salt.utils.files.fopen(
+        dst, "wb"
+    ) as ofile:
+        while True:
+            chunk = ifile.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            ofile.write(chunk)
+    return hasher.hexdigest()
+
+
+def _get_cached_hash(path, form):
+    """
+    Return the hash sum of a cached source file, remembering it in
+    ``__context__`` for as long as the file is not modified
+    """
+    fstat = os.stat(path)
+    stamp = (fstat.st_ino, fstat.st_size, fstat.st_mtime_ns)
+    contextkey = f"file.hash_|-{path}_|-{form}"
+    cached = __context__.get(contextkey)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    hsum = get_hash(path, form)
+    __context__[contextkey] = (stamp, hsum)
+    return hsum
+
+
+def _get_source_mode(source, saltenv):
+    """
+    Return the mode of ``source`` as reported by ``cp.stat_file``. Within a
+    state run the result is remembered in ``__context__``, tied to the run's
+    file client, so that it is looked up again on the next run.
+    """
+    fileclient = __context__.get("fileclient")
+    if fileclient is None:
+        return __salt__["cp.stat_file"](source, saltenv=saltenv, octal=True)
+    run, modes = __context__.get("file.stat_file", (None, None))
+    if run is not fileclient:
+        modes = {}
+        __context__["file.stat_file"] = (fileclient, modes)
+    if (source, saltenv) not in modes:
+        modes[(source, saltenv)] = __salt__["cp.stat_file"](
+            source, saltenv=saltenv, octal=True
+        )
+    return modes[(source, saltenv)]
+
+
 def get_source_sum(
     file_name="",
     source="",
@@ -1675,7 +1776,7 @@ def comment_line(path, regex, char="#", cmnt=True, backup=".bak"):
     if not found:
         return False
 
-    if not salt.utils.platform.is_windows():
+    if not _IS_WINDOWS:
         pre_user = get_user(path)
         pre_group = get_group(path)
         pre_mode = salt.utils.files.normalize_mode(get_mode(path))
@@ -1737,7 +1838,7 @@ def comment_line(path, regex, char="#", cmnt=True, backup=".bak"):
     else:
         os.remove(temp_file)
 
-    if not salt.utils.platform.is_windows():
+    if not _IS_WINDOWS:
         check_perms(path, None, pre_user, pre_group, pre_mode)
 
     # Return a diff using the two dictionaries
@@ -2648,7 +2749,7 @@ def replace(
         )
 
     if encoding is not None:
-        if not salt.utils.platform.is_windows():
+        if not _IS_WINDOWS:
             pre_user = get_user(path)
             pre_group = get_group(path)
             pre_mode = salt.utils.files.normalize_mode(get_mode(path))
@@ -2769,7 +2870,7 @@ def replace(
                     f"Unable to delete temp file '{enc_temp_file}'. Exception: {exc}"
                 )
 
-        if not dry_run and not salt.utils.platform.is_windows():
+        if not dry_run and not _IS_WINDOWS:
             check_perms(path, None, pre_user, pre_group, pre_mode)
 
         differences = __utils__["stringutils.get_diff"](orig_file, new_file)
@@ -2792,7 +2893,7 @@ def replace(
     has_changes = False
     orig_file = []  # used for show_changes and change detection
     new_file = []  # used for show_changes and change detection
-    if not salt.utils.platform.is_windows():
+    if not _IS_WINDOWS:
         pre_user = get_user(path)
         pre_group = get_group(path)
         pre_mode = salt.utils.files.normalize_mode(get_mode(path))
@@ -2981,7 +3082,7 @@ def replace(
                 f"Unable to delete temp file '{temp_file}'. Exception: {exc}"
             )
 
-    if not dry_run and not salt.utils.platform.is_windows():
+    if not dry_run and not _IS_WINDOWS:
         check_perms(path, None, pre_user, pre_group, pre_mode)
 
     differences = __utils__["stringutils.get_diff"](orig_file, new_file)
@@ -3307,7 +3408,7 @@ def blockreplace(
                 backup_path = f"{path}{backup}"
                 shutil.copy2(path, backup_path)
                 # copy2 does not preserve ownership
-                if salt.utils.platform.is_windows():
+                if _IS_WINDOWS:
                     # This function resides in win_file.py and will be available
                     # on Windows. The local function will be overridden
                     # pylint: disable=E1120,E1123
@@ -3342,7 +3443,7 @@ def blockreplace(
             backup_path = f"{path}{backup}"
             shutil.copy2(path, backup_path)
             # copy2 does not preserve ownership
-            if salt.utils.platform.is_windows():
+            if _IS_WINDOWS:
                 # This function resides in win_file.py and will be available
                 # on Windows. The local function will be overridden
                 # pylint: disable=E1120,E1123
@@ -3362,7 +3463,7 @@ def blockreplace(
             fh_.close()
 
         # this may have overwritten file attrs
-        if salt.utils.platform.is_windows():
+        if _IS_WINDOWS:
             # This function resides in win_file.py and will be available
             # on Windows. The local function will be overridden
             # pylint: disable=E1120,E1123
@@ -4153,7 +4254,7 @@ def copy(src, dst, recurse=False, remove_existing=False):
     if not os.path.exists(src):
         raise CommandExecutionError(f"No such file or directory '{src}'")
 
-    if not salt.utils.platform.is_windows():
+    if not _IS_WINDOWS:
         pre_user = get_user(src)
         pre_group = get_group(src)
         pre_mode = salt.utils.files.normalize_mode(get_mode(src))
@@ -4176,7 +4277,7 @@ def copy(src, dst, recurse=False, remove_existing=False):
     except OSError:
         raise CommandExecutionError(f"Could not copy '{src}' to '{dst}'")
 
-    if not salt.utils.platform.is_windows():
+    if not _IS_WINDOWS:
         check_perms(dst, None, pre_user, pre_group, pre_mode)
     return True
 
@@ -4750,7 +4851,7 @@ def source_list(source, source_hash, saltenv):
                 single_hash = single[single_src] if single[single_src] else source_hash
                 urlparsed_single_src = urllib.parse.urlparse(single_src)
                 # Fix this for Windows
-                if salt.utils.platform.is_windows():
+                if _IS_WINDOWS:
                     # urlparse doesn't handle a local Windows path without the
                     # protocol indicator (file://). The scheme will be the
                     # drive letter instead of the protocol. So, we'll add the
@@ -4796,7 +4897,7 @@ def source_list(source, source_hash, saltenv):
                     ret = (single, source_hash)
                     break
                 urlparsed_src = urllib.parse.urlparse(single)
-                if salt.utils.platform.is_windows():
+                if _IS_WINDOWS:
                     # urlparse doesn't handle a local Windows path without the
                     # protocol indicator (file://). The scheme will be the
                     # drive letter instead of the protocol. So, we'll add the
@@ -5523,22 +5624,14 @@ def check_perms(
 
     # Check and make user/group/mode changes, then verify they were successful
     if user:
-        if (
-            salt.utils.platform.is_windows() and not user_to_uid(user) == cur["uid"]
-        ) or (
-            not salt.utils.platform.is_windows()
-            and not user == cur["user"]
-            and not user == cur["uid"]
+        if (_IS_WINDOWS and not user_to_uid(user) == cur["uid"]) or (
+            not _IS_WINDOWS and not user == cur["user"] and not user == cur["uid"]
         ):
             perms["cuser"] = user
 
     if group:
-        if (
-            salt.utils.platform.is_windows() and not group_to_gid(group) == cur["gid"]
-        ) or (
-            not salt.utils.platform.is_windows()
-            and not group == cur["group"]
-            and not group == cur["gid"]
+        if (_IS_WINDOWS and not group_to_gid(group) == cur["gid"]) or (
+            not _IS_WINDOWS and not group == cur["group"] and not group == cur["gid"]
         ):
             perms["cgroup"] = group
 
@@ -5578,12 +5671,8 @@ def check_perms(
     # verify user/group/mode changes
     post = stats(name, follow_symlinks=follow_symlinks)
     if user:
-        if (
-            salt.utils.platform.is_windows() and not user_to_uid(user) == post["uid"]
-        ) or (
-            not salt.utils.platform.is_windows()
-            and not user == post["user"]
-            and not user == post["uid"]
+        if (_IS_WINDOWS and not user_to_uid(user) == post["uid"]) or (
+            not _IS_WINDOWS and not user == post["user"] and not user == post["uid"]
         ):
             if __opts__["test"] is True:
                 ret["changes"]["user"] = user
@@ -5594,12 +5683,8 @@ def check_perms(
             ret["changes"]["user"] = user
 
     if group:
-        if (
-            salt.utils.platform.is_windows() and not group_to_gid(group) == post["gid"]
-        ) or (
-            not salt.utils.platform.is_windows()
-            and not group == post["group"]
-            and not group == post["gid"]
+        if (_IS_WINDOWS and not group_to_gid(group) == post["gid"]) or (
+            not _IS_WINDOWS and not group == post["group"] and not group == post["gid"]
         ):
             if __opts__["test"] is True:
                 ret["changes"]["group"] = group
@@ -6233,7 +6318,7 @@ def check_file_meta(
                     if any(
                         [ignore_ordering, ignore_whitespace, ignore_comment_characters]
                     ):
-                        has_changes, changes["diff"] = get_diff(
+                        has_changes, changes["diff"] = _get_diff(
                             name,
                             sfn,
                             template=True,
@@ -6241,10 +6326,15 @@ def check_file_meta(
                             ignore_ordering=ignore_ordering,
                             ignore_whitespace=ignore_whitespace,
                             ignore_comment_characters=ignore_comment_characters,
+                            check_identical=False,
                         )
                     elif lstats:
-                        changes["diff"] = get_diff(
-                            name, sfn, template=True, show_filenames=False
+                        changes["diff"] = _get_diff(
+                            name,
+                            sfn,
+                            template=True,
+                            show_filenames=False,
+                            check_identical=False,
                         )
                     else:
                         # Since the target file doesn't exist, create an empty one to
@@ -6254,7 +6344,9 @@ def check_file_meta(
                         )
                         with salt.utils.files.fopen(tmp_empty, "wb") as tmp_:
                             tmp_.write(b"")
-                        changes["diff"] = get_diff(tmp_empty, sfn, show_filenames=False)
+                        changes["diff"] = _get_diff(
+                            tmp_empty, sfn, show_filenames=False, check_identical=False
+                        )
 
                 except CommandExecutionError as exc:
                     changes["diff"] = exc.strerror
@@ -6273,7 +6365,7 @@ def check_file_meta(
             tmp = salt.utils.files.mkstemp(
                 prefix=salt.utils.files.TEMPFILE_PREFIX, text=True
             )
-            if salt.utils.platform.is_windows():
+            if _IS_WINDOWS:
                 contents = os.linesep.join(
                     _splitlines_preserving_trailing_newline(contents)
                 )
@@ -6314,7 +6406,7 @@ def check_file_meta(
     if not lstats:
         return changes
 
-    if not salt.utils.platform.is_windows():
+    if not _IS_WINDOWS:
         # Check owner
         if user is not None and user != lstats["user"] and user != lstats["uid"]:
             changes["user"] = user
@@ -6372,6 +6464,33 @@ def check_file_meta(
     return changes
 
 
+def _files_equal(path1, path2, chunk_size=1048576):
+    """
+    Return whether two files have the same contents. The files are memory
+    mapped and compared a block at a time, without copying their contents.
+    """
+    size = os.path.getsize(path1)
+    if size != os.path.getsize(path2):
+        return False
+    if not size:
+        # mmap throws a ValueError if the file is empty.
+        return True
+    with salt.utils.files.fopen(path1, "rb") as fp1_, salt.utils.files.fopen(
+        path2, "rb"
+    ) as fp2_:
+        with mmap.mmap(fp1_.fileno(), 0, access=mmap.ACCESS_READ) as map1, mmap.mmap(
+            fp2_.fileno(), 0, access=mmap.ACCESS_READ
+        ) as map2:
+            if len(map1) != len(map2):
+                return False
+            with memoryview(map1) as view1, memoryview(map2) as view2:
+                for offset in range(0, len(view1), chunk_size):
+                    end = offset + chunk_size
+                    if view1[offset:end] != view2[offset:end]:
+                        return False
+    return True
+
+
 def get_diff(
     file1,
     file2,
@@ -6475,6 +6594,40 @@ def get_diff(
         salt '*' file.get_diff /home/fred/.vimrc salt://users/fred/.vimrc
         salt '*' file.get_diff /tmp/foo.txt /tmp/bar.txt
     """
+    return _get_diff(
+        file1,
+        file2,
+        saltenv=saltenv,
+        show_filenames=show_filenames,
+        show_changes=show_changes,
+        template=template,
+        source_hash_file1=source_hash_file1,
+        source_hash_file2=source_hash_file2,
+        ignore_ordering=ignore_ordering,
+        ignore_whitespace=ignore_whitespace,
+        ignore_comment_characters=ignore_comment_characters,
+    )
+
+
+def _get_diff(
+    file1,
+    file2,
+    saltenv="base",
+    show_filenames=True,
+    show_changes=True,
+    template=False,
+    source_hash_file1=None,
+    source_hash_file2=None,
+    ignore_ordering=False,
+    ignore_whitespace=False,
+    ignore_comment_characters=None,
+    check_identical=True,
+):
+    """
+    Do the work of ``get_diff``. ``check_identical`` can be set to ``False``
+    by callers that already know the files differ (e.g. because their hashes
+    do not match) to skip comparing them byte for byte first.
+    """
     files = (file1, file2)
     source_hashes = (source_hash_file1, source_hash_file2)
     paths = []
@@ -6502,6 +6655,18 @@ def get_diff(
     if errors:
         raise CommandExecutionError("Failed to cache one or more files", info=errors)
 
+    # Find out if there are no changes without reading the files line by line,
+    # unless the caller has already compared them
+    if check_identical:
+        try:
+            identical = _files_equal(*paths)
+        except (OSError, ValueError):
+            identical = False
+        if identical:
+            if any([ignore_ordering, ignore_whitespace, ignore_comment_characters]):
+                return (False, "")
+            return ""
+
     args = []
     for filename in paths:
         try:
@@ -6542,6 +6707,102 @@ def get_diff(
     return ret
 
 
+def _new_file_diff(path):
+    """
+    Return the diff of a new file against an empty one, the same way that
+    ``get_diff`` would, without writing an empty file to disk to compare
+    against.
+    """
+    try:
+        with salt.utils.files.fopen(path, "rb") as fp_:
+            lines = fp_.readlines()
+    except OSError as exc:
+        raise CommandExecutionError(
+            "Failed to read {}: {}".format(
+                salt.utils.stringutils.to_unicode(path), exc.strerror
+            )
+        )
+    if not lines:
+        return ""
+    if not __utils__["files.is_text"](path):
+        return "Replace text file with binary file"
+    return __utils__["stringutils.get_diff"]([], lines)
+
+
+def _check_perms_posix(
+    name,
+    ret,
+    user,
+    group,
+    mode,
+    attrs,
+    follow_symlinks=False,
+    seuser=None,
+    serole=None,
+    setype=None,
+    serange=None,
+    **kwargs,
+):
+    """
+    Run the POSIX check_perms for manage_file and return only the ret dict
+    """
+    ret, _ = check_perms(
+        name,
+        ret,
+        user,
+        group,
+        mode,
+        attrs,
+        follow_symlinks,
+        seuser=seuser,
+        serole=serole,
+        setype=setype,
+        serange=serange,
+    )
+    return ret
+
+
+def _check_perms_windows(
+    name,
+    ret,
+    user,
+    group,
+    mode,
+    attrs,
+    follow_symlinks=False,
+    seuser=None,
+    serole=None,
+    setype=None,
+    serange=None,
+    **kwargs,
+):
+    """
+    Run the Windows check_perms for manage_file, translating the win_*
+    arguments of the state
+    """
+    # This function resides in win_file.py and will be available
+    # on Windows. The local function will be overridden
+    # pylint: disable=E1120,E1121,E1123
+    return check_perms(
+        path=name,
+        ret=ret,
+        owner=kwargs.get("win_owner"),
+        grant_perms=kwargs.get("win_perms"),
+        deny_perms=kwargs.get("win_deny_perms"),
+        inheritance=kwargs.get("win_inheritance", True),
+        reset=kwargs.get("win_perms_reset", False),
+    )
+    # pylint: enable=E1120,E1121,E1123
+
+
+# The platform does not change at runtime, pick the check_perms calling
+# convention manage_file uses once
+if _IS_WINDOWS:
+    _check_perms_adapter = _check_perms_windows
+else:
+    _check_perms_adapter = _check_perms_posix
+
+
 def manage_file(
     name,
     sfn,
@@ -6907,12 +7168,57 @@ def manage_file(
     """
     name = os.path.expanduser(name)
     has_changes = False
+    source_scheme = urllib.parse.urlparse(source).scheme if source else ""
     check_web_source_hash = bool(
-        source
-        and urllib.parse.urlparse(source).scheme != "salt"
-        and not skip_verify
-        and not use_etag
+        source and source_scheme != "salt" and not skip_verify and not use_etag
     )
+    cache_file = __salt__["cp.cache_file"]
+    backup_mode = __salt__["config.backup_mode"]
+    config_option = __salt__["config.option"]
+
+    # The checksum and signature of a downloaded file only need to be
+    # verified once, whichever of the branches below end up using it
+    verified = {}
+
+    def _verify_source(sfn, dl_sum=None):
+        """
+        Verify the checksum and signature of the cached source file, returning
+        an error message if they do not check out. ``dl_sum`` can be passed if
+        the checksum of ``sfn`` has already been computed.
+        """
+        if sfn in verified:
+            return verified[sfn]
+        err = None
+        if check_web_source_hash:
+            if dl_sum is None:
+                dl_sum = _get_cached_hash(sfn, source_sum["hash_type"])
+            if dl_sum != source_sum["hsum"]:
+                err = (
+                    "Specified {} checksum for {} ({}) does not match "
+                    "actual checksum ({}). If the 'source_hash' value "
+                    "refers to a remote file with multiple possible "
+                    "matches, then it may be necessary to set "
+                    "'source_hash_name'.".format(
+                        source_sum["hash_type"], source, source_sum["hsum"], dl_sum
+                    )
+                )
+        if err is None and signature:
+            try:
+                _check_sig(
+                    sfn,
+                    signature=signature if signature is not True else None,
+                    signed_by_any=signed_by_any,
+                    signed_by_all=signed_by_all,
+                    keyring=keyring,
+                    gnupghome=gnupghome,
+                    sig_backend=sig_backend,
+                    saltenv=saltenv,
+                    verify_ssl=verify_ssl,
+                )
+            except CommandExecutionError as exc:
+                err = f"Failed checking new file's signature: {exc}"
+        verified[sfn] = err
+        return err
 
     if not ret:
         ret = {"name": name, "changes": {}, "comment": "", "result": True}
@@ -6923,29 +7229,35 @@ def manage_file(
     if source:
         if not sfn:
             # File is not present, cache it
-            sfn = __salt__["cp.cache_file"](source, saltenv, verify_ssl=verify_ssl)
+            sfn = cache_file(source, saltenv, verify_ssl=verify_ssl)
             if not sfn:
                 return _error(ret, f"Source file '{source}' not found")
             htype = source_sum.get("hash_type", __opts__["hash_type"])
             # Recalculate source sum now that file has been cached
-            source_sum = {"hash_type": htype, "hsum": get_hash(sfn, form=htype)}
+            source_sum = {"hash_type": htype, "hsum": _get_cached_hash(sfn, htype)}
 
         if keep_mode:
-            if urllib.parse.urlparse(source).scheme in ("salt", "file", ""):
+            if source_scheme in ("salt", "file", ""):
                 try:
-                    mode = __salt__["cp.stat_file"](source, saltenv=saltenv, octal=True)
+                    mode = _get_source_mode(source, saltenv)
                 except Exception as exc:  # pylint: disable=broad-except
                     log.warning("Unable to stat %s: %s", sfn, exc)
 
-    # Check changes if the target file exists
-    if os.path.isfile(name) or os.path.islink(name):
-        if os.path.islink(name) and follow_symlinks:
+    # Check changes if the target file exists. A single lstat tells both if
+    # it is there and if it is a symlink.
+    try:
+        name_mode = os.lstat(name).st_mode
+    except OSError:
+        name_mode = 0
+    name_is_link = stat.S_ISLNK(name_mode)
+    if name_is_link or stat.S_ISREG(name_mode):
+        if name_is_link and follow_symlinks:
             real_name = os.path.realpath(name)
         else:
             real_name = name
 
         # Only test the checksums on files with managed contents
-        if source and not (not follow_symlinks and os.path.islink(real_name)):
+        if source and not (not follow_symlinks and name_is_link):
             name_sum = get_hash(
                 real_name, source_sum.get("hash_type", __opts__["hash_type"])
             )
@@ -6958,83 +7270,90 @@ def manage_file(
             or source_sum.get("hsum", __opts__["hash_type"]) != name_sum
         ):
             if not sfn:
-                sfn = __salt__["cp.cache_file"](
+                sfn = cache_file(
                     source, saltenv, verify_ssl=verify_ssl, use_etag=use_etag
                 )
             if not sfn:
                 return _error(ret, f"Source file '{source}' not found")
             # If the downloaded file came from a non salt server or local
             # source, and we are not skipping checksum verification, then
-            # verify that it matches the specified checksum.
-            if check_web_source_hash:
-                dl_sum = get_hash(sfn, source_sum["hash_type"])
-                if dl_sum != source_sum["hsum"]:
-                    ret["comment"] = (
-                        "Specified {} checksum for {} ({}) does not match "
-                        "actual checksum ({}). If the 'source_hash' value "
-                        "refers to a remote file with multiple possible "
-                        "matches, then it may be necessary to set "
-                        "'source_hash_name'.".format(
-                            source_sum["hash_type"], source, source_sum["hsum"], dl_sum
-                        )
+            # verify that it matches the specified checksum. The file is
+            # staged in the cachedir while hashing it, so that it only has to
+            # be read once, and is only moved next to the target once it has
+            # been verified.
+            staged = dl_sum = None
+            try:
+                if check_web_source_hash:
+                    staged = salt.utils.files.mkstemp(
+                        prefix=salt.utils.files.TEMPFILE_PREFIX,
+                        dir=__opts__["cachedir"],
                     )
-                    ret["result"] = False
-                    return ret
+                    try:
+                        dl_sum = _copy_and_hash(sfn, staged, source_sum["hash_type"])
+                    except OSError as io_error:
+                        __clean_tmp(sfn)
+                        return _error(ret, f"Failed to commit change: {io_error}")
+                err = _verify_source(sfn, dl_sum)
+                if err:
+                    return _error(ret, err)
 
-            if signature:
-                try:
-                    _check_sig(
-                        sfn,
-                        signature=signature if signature is not True else None,
-                        signed_by_any=signed_by_any,
-                        signed_by_all=signed_by_all,
-                        keyring=keyring,
-                        gnupghome=gnupghome,
-                        sig_backend=sig_backend,
-                        saltenv=saltenv,
-                        verify_ssl=verify_ssl,
-                    )
-                except CommandExecutionError as err:
-                    ret["result"] = False
-                    ret["comment"] = f"Failed checking new file's signature: {err}"
-                    return ret
+                # Print a diff equivalent to diff -u old new
+                if config_option("obfuscate_templates"):
+                    ret["changes"]["diff"] = "<Obfuscated Template>"
+                elif not show_changes:
+                    ret["changes"]["diff"] = "<show_changes=False>"
+                else:
+                    try:
+                        if any(
+                            [
+                                ignore_ordering,
+                                ignore_whitespace,
+                                ignore_comment_characters,
+                            ]
+                        ):
+                            has_changes, file_diff = _get_diff(
+                                real_name,
+                                sfn,
+                                show_filenames=False,
+                                ignore_ordering=ignore_ordering,
+                                ignore_whitespace=ignore_whitespace,
+                                ignore_comment_characters=ignore_comment_characters,
+                                check_identical=False,
+                            )
+                        else:
+                            file_diff = _get_diff(
+                                real_name,
+                                sfn,
+                                show_filenames=False,
+                                check_identical=False,
+                            )
+                        if file_diff:
+                            ret["changes"]["diff"] = file_diff
+                    except CommandExecutionError as exc:
+                        ret["changes"]["diff"] = exc.strerror
 
-            # Print a diff equivalent to diff -u old new
-            if __salt__["config.option"]("obfuscate_templates"):
-                ret["changes"]["diff"] = "<Obfuscated Template>"
-            elif not show_changes:
-                ret["changes"]["diff"] = "<show_changes=False>"
-            else:
+                # Pre requisites are met, and the file needs to be replaced, do it
                 try:
-                    if any(
-                        [ignore_ordering, ignore_whitespace, ignore_comment_characters]
-                    ):
-                        has_changes, file_diff = get_diff(
+                    if staged and _same_fs(staged, real_name):
+                        salt.utils.files.replacefile(
+                            staged,
                             real_name,
-                            sfn,
-                            show_filenames=False,
-                            ignore_ordering=ignore_ordering,
-                            ignore_whitespace=ignore_whitespace,
-                            ignore_comment_characters=ignore_comment_characters,
+                            backup_mode(backup),
+                            __opts__["cachedir"],
                         )
                     else:
-                        file_diff = get_diff(real_name, sfn, show_filenames=False)
-                    if file_diff:
-                        ret["changes"]["diff"] = file_diff
-                except CommandExecutionError as exc:
-                    ret["changes"]["diff"] = exc.strerror
-
-            # Pre requisites are met, and the file needs to be replaced, do it
-            try:
-                salt.utils.files.copyfile(
-                    sfn,
-                    real_name,
-                    __salt__["config.backup_mode"](backup),
-                    __opts__["cachedir"],
-                )
-            except OSError as io_error:
-                __clean_tmp(sfn)
-                return _error(ret, f"Failed to commit change: {io_error}")
+                        _commit_file(
+                            sfn,
+                            real_name,
+                            backup_mode(backup),
+                            __opts__["cachedir"],
+                        )
+                except OSError as io_error:
+                    __clean_tmp(sfn)
+                    return _error(ret, f"Failed to commit change: {io_error}")
+            finally:
+                if staged:
+                    salt.utils.files.remove(staged)
 
         if contents is not None:
             # Write the static contents to a temporary file
@@ -7043,7 +7362,7 @@ def manage_file(
             )
             with salt.utils.files.fopen(tmp, "wb") as tmp_:
                 if encoding:
-                    if salt.utils.platform.is_windows():
+                    if _IS_WINDOWS:
                         contents = os.linesep.join(
                             _splitlines_preserving_trailing_newline(contents)
                         )
@@ -7086,10 +7405,10 @@ def manage_file(
 
                 # Pre requisites are met, the file needs to be replaced, do it
                 try:
-                    salt.utils.files.copyfile(
+                    _commit_file(
                         tmp,
                         real_name,
-                        __salt__["config.backup_mode"](backup),
+                        backup_mode(backup),
                         __opts__["cachedir"],
                     )
                 except OSError as io_error:
@@ -7100,46 +7419,20 @@ def manage_file(
         # Check for changing symlink to regular file here
         if os.path.islink(name) and not follow_symlinks:
             if not sfn:
-                sfn = __salt__["cp.cache_file"](source, saltenv, verify_ssl=verify_ssl)
+                sfn = cache_file(source, saltenv, verify_ssl=verify_ssl)
             if not sfn:
                 return _error(ret, f"Source file '{source}' not found")
             # If the downloaded file came from a non salt server source verify
-            # that it matches the intended sum value
-            if check_web_source_hash:
-                dl_sum = get_hash(sfn, source_sum["hash_type"])
-                if dl_sum != source_sum["hsum"]:
-                    ret["comment"] = (
-                        "Specified {} checksum for {} ({}) does not match "
-                        "actual checksum ({})".format(
-                            source_sum["hash_type"], name, source_sum["hsum"], dl_sum
-                        )
-                    )
-                    ret["result"] = False
-                    return ret
-
-            if signature:
-                try:
-                    _check_sig(
-                        sfn,
-                        signature=signature if signature is not True else None,
-                        signed_by_any=signed_by_any,
-                        signed_by_all=signed_by_all,
-                        keyring=keyring,
-                        gnupghome=gnupghome,
-                        sig_backend=sig_backend,
-                        saltenv=saltenv,
-                        verify_ssl=verify_ssl,
-                    )
-                except CommandExecutionError as err:
-                    ret["result"] = False
-                    ret["comment"] = f"Failed checking new file's signature: {err}"
-                    return ret
+            # that it matches the intended sum value and signature
+            err = _verify_source(sfn)
+            if err:
+                return _error(ret, err)
 
             try:
-                salt.utils.files.copyfile(
+                _commit_file(
                     sfn,
                     name,
-                    __salt__["config.backup_mode"](backup),
+                    backup_mode(backup),
                     __opts__["cachedir"],
                 )
             except OSError as io_error:
@@ -7148,34 +7441,20 @@ def manage_file(
 
             ret["changes"]["diff"] = "Replace symbolic link with regular file"
 
-        if salt.utils.platform.is_windows():
-            # This function resides in win_file.py and will be available
-            # on Windows. The local function will be overridden
-            # pylint: disable=E1120,E1121,E1123
-            ret = check_perms(
-                path=name,
-                ret=ret,
-                owner=kwargs.get("win_owner"),
-                grant_perms=kwargs.get("win_perms"),
-                deny_perms=kwargs.get("win_deny_perms"),
-                inheritance=kwargs.get("win_inheritance", True),
-                reset=kwargs.get("win_perms_reset", False),
-            )
-            # pylint: enable=E1120,E1121,E1123
-        else:
-            ret, _ = check_perms(
-                name,
-                ret,
-                user,
-                group,
-                mode,
-                attrs,
-                follow_symlinks,
-                seuser=seuser,
-                serole=serole,
-                setype=setype,
-                serange=serange,
-            )
+        ret = _check_perms_adapter(
+            name,
+            ret,
+            user,
+            group,
+            mode,
+            attrs,
+            follow_symlinks,
+            seuser=seuser,
+            serole=serole,
+            setype=setype,
+            serange=serange,
+            **kwargs,
+        )
 
         if ret["changes"]:
             ret["comment"] = f"File {salt.utils.data.decode(name)} updated"
@@ -7197,7 +7476,7 @@ def manage_file(
 
         def _set_mode_and_make_dirs(name, dir_mode, mode, user, group):
             # check for existence of windows drive letter
-            if salt.utils.platform.is_windows():
+            if _IS_WINDOWS:
                 drive, _ = os.path.splitdrive(name)
                 if drive and not os.path.exists(drive):
                     __clean_tmp(sfn)
@@ -7207,13 +7486,13 @@ def manage_file(
                 # dir_mode was not specified. Otherwise, any
                 # directories created with makedirs_() below can't be
                 # listed via a shell.
-                mode_list = [x for x in str(mode)][-3:]
-                for idx, part in enumerate(mode_list):
-                    if part != "0":
-                        mode_list[idx] = str(int(part) | 1)
-                dir_mode = "".join(mode_list)
+                perms = int(str(mode)[-3:], 8)
+                for shift in (0, 3, 6):
+                    if perms >> shift & 0o7:
+                        perms |= 1 << shift
+                dir_mode = f"{perms:03o}"
 
-            if salt.utils.platform.is_windows():
+            if _IS_WINDOWS:
                 # This function resides in win_file.py and will be available
                 # on Windows. The local function will be overridden
                 # pylint: disable=E1120,E1121,E1123
@@ -7232,53 +7511,19 @@ def manage_file(
         if source:
             # Apply the new file
             if not sfn:
-                sfn = __salt__["cp.cache_file"](source, saltenv, verify_ssl=verify_ssl)
+                sfn = cache_file(source, saltenv, verify_ssl=verify_ssl)
             if not sfn:
                 return _error(ret, f"Source file '{source}' not found")
             # If the downloaded file came from a non salt server source verify
-            # that it matches the intended sum value
-            if check_web_source_hash:
-                dl_sum = get_hash(sfn, source_sum["hash_type"])
-                if dl_sum != source_sum["hsum"]:
-                    ret["comment"] = (
-                        "Specified {} checksum for {} ({}) does not match "
-                        "actual checksum ({})".format(
-                            source_sum["hash_type"], name, source_sum["hsum"], dl_sum
-                        )
-                    )
-                    ret["result"] = False
-                    return ret
-
-            if signature:
-                try:
-                    _check_sig(
-                        sfn,
-                        signature=signature if signature is not True else None,
-                        signed_by_any=signed_by_any,
-                        signed_by_all=signed_by_all,
-                        keyring=keyring,
-                        gnupghome=gnupghome,
-                        sig_backend=sig_backend,
-                        saltenv=saltenv,
-                        verify_ssl=verify_ssl,
-                    )
-                except CommandExecutionError as err:
-                    ret["result"] = False
-                    ret["comment"] = f"Failed checking new file's signature: {err}"
-                    return ret
+            # that it matches the intended sum value and signature
+            err = _verify_source(sfn)
+            if err:
+                return _error(ret, err)
 
             # It is a new file, set the diff accordingly
             ret["changes"]["diff"] = "New file"
             if new_file_diff:
-
-                # Since the target file doesn't exist, create an empty one to
-                # compare against
-                tmp_empty = salt.utils.files.mkstemp(
-                    prefix=salt.utils.files.TEMPFILE_PREFIX, text=False
-                )
-                with salt.utils.files.fopen(tmp_empty, "wb") as tmp_:
-                    tmp_.write(b"")
-                ret["changes"]["diff"] = get_diff(tmp_empty, sfn, show_filenames=False)
+                ret["changes"]["diff"] = _new_file_diff(sfn)
 
             if not os.path.isdir(contain_dir):
                 if makedirs:
@@ -7323,7 +7568,7 @@ def manage_file(
             )
             with salt.utils.files.fopen(tmp, "wb") as tmp_:
                 if encoding:
-                    if salt.utils.platform.is_windows():
+                    if _IS_WINDOWS:
                         contents = os.linesep.join(
                             _splitlines_preserving_trailing_newline(contents)
                         )
@@ -7335,62 +7580,37 @@ def manage_file(
                     tmp_.write(salt.utils.stringutils.to_bytes(contents))
 
             if new_file_diff and ret["changes"]["diff"] == "New file":
-                # Since the target file doesn't exist, create an empty one to
-                # compare against
-                tmp_empty = salt.utils.files.mkstemp(
-                    prefix=salt.utils.files.TEMPFILE_PREFIX, text=False
-                )
-                with salt.utils.files.fopen(tmp_empty, "wb") as tmp_:
-                    tmp_.write(b"")
-                ret["changes"]["diff"] = get_diff(tmp_empty, tmp, show_filenames=False)
+                ret["changes"]["diff"] = _new_file_diff(tmp)
 
             # Copy into place
-            salt.utils.files.copyfile(
-                tmp, name, __salt__["config.backup_mode"](backup), __opts__["cachedir"]
-            )
+            _commit_file(tmp, name, backup_mode(backup), __opts__["cachedir"])
             __clean_tmp(tmp)
         # Now copy the file contents if there is a source file
         elif sfn:
-            salt.utils.files.copyfile(
-                sfn, name, __salt__["config.backup_mode"](backup), __opts__["cachedir"]
-            )
+            _commit_file(sfn, name, backup_mode(backup), __opts__["cachedir"])
             __clean_tmp(sfn)
 
         # This is a new file, if no mode specified, use the umask to figure
         # out what mode to use for the new file.
-        if mode is None and not salt.utils.platform.is_windows():
+        if mode is None and not _IS_WINDOWS:
             # Get current umask
             mask = salt.utils.files.get_umask()
             # Calculate the mode value that results from the umask
             mode = oct((0o777 ^ mask) & 0o666)
 
-        if salt.utils.platform.is_windows():
-            # This function resides in win_file.py and will be available
-            # on Windows. The local function will be overridden
-            # pylint: disable=E1120,E1121,E1123
-            ret = check_perms(
-                path=name,
-                ret=ret,
-                owner=kwargs.get("win_owner"),
-                grant_perms=kwargs.get("win_perms"),
-                deny_perms=kwargs.get("win_deny_perms"),
-                inheritance=kwargs.get("win_inheritance", True),
-                reset=kwargs.get("win_perms_reset", False),
-            )
-            # pylint: enable=E1120,E1121,E1123
-        else:
-            ret, _ = check_perms(
-                name,
-                ret,
-                user,
-                group,
-                mode,
-                attrs,
-                seuser=seuser,
-                serole=serole,
-                setype=setype,
-                serange=serange,
-            )
+        ret = _check_perms_adapter(
+            name,
+            ret,
+            user,
+            group,
+            mode,
+            attrs,
+            seuser=seuser,
+            serole=serole,
+            setype=setype,
+            serange=serange,
+            **kwargs,
+        )
 
         if not ret["comment"]:
             ret["comment"] = "File " + name + " updated"
@@ -7459,41 +7679,44 @@ def makedirs_(path, user=None, group=None, mode=None):
         mode = salt.utils.files.normalize_mode(mode)
 
     # walk up the directory structure until we find the first existing
-    # directory
+    # directory, a single stat per level tells whether it is there
     dirname = os.path.normpath(os.path.dirname(path))
 
-    if os.path.isdir(dirname):
-        # There's nothing for us to do
-        msg = f"Directory '{dirname}' already exists"
-        log.debug(msg)
-        return msg
-
-    if os.path.exists(dirname):
-        msg = f"The path '{dirname}' already exists and is not a directory"
-        log.debug(msg)
-        return msg
-
     directories_to_create = []
+    current_dirname = dirname
     while True:
-        if os.path.isdir(dirname):
-            break
+        try:
+            current_mode = os.stat(current_dirname).st_mode
+        except OSError:
+            pass
+        else:
+            if directories_to_create:
+                break
+            if stat.S_ISDIR(current_mode):
+                # There's nothing for us to do
+                msg = f"Directory '{dirname}' already exists"
+            else:
+                msg = f"The path '{dirname}' already exists and is not a directory"
+            log.debug(msg)
+            return msg
 
-        directories_to_create.append(dirname)
-        current_dirname = dirname
-        dirname = os.path.dirname(dirname)
+        directories_to_create.append(current_dirname)
+        parent_dirname = os.path.dirname(current_dirname)
 
-        if current_dirname == dirname:
+        if parent_dirname == current_dirname:
             raise SaltInvocationError(
                 "Recursive creation for path '{}' would result in an "
-                "infinite loop. Please use an absolute path.".format(dirname)
+                "infinite loop. Please use an absolute path.".format(parent_dirname)
             )
+        current_dirname = parent_dirname
 
-    # create parent directories from the topmost to the most deeply nested one
-    directories_to_create.reverse()
-    for directory_to_create in directories_to_create:
+    # create all of the missing directories at once, then set the user, group
+    # and mode from the topmost to the most deeply nested one
+    log.debug("Creating directory: %s", dirname)
+    os.makedirs(dirname, exist_ok=True)
+    for directory_to_create in reversed(directories_to_create):
         # all directories have the user, group and mode set!!
-        log.debug("Creating directory: %s", directory_to_create)
-        mkdir(directory_to_create, user=user, group=group, mode=mode)
+        check_perms(directory_to_create, None, user, group, mode)
 
 
 def makedirs_perms(name, user=None, group=None, mode="0755"):
@@ -7508,22 +7731,63 @@ def makedirs_perms(name, user=None, group=None, mode="0755"):
         salt '*' file.makedirs_perms /opt/code
     """
     name = os.path.expanduser(name)
+    perms = _parse_mode(mode)
+    mode = f"{perms:o}" if perms is not None else None
 
-    path = os.path
-    head, tail = path.split(name)
+    head, tail = os.path.split(name)
     if not tail:
-        head, tail = path.split(head)
-    if head and tail and not path.exists(head):
-        try:
-            makedirs_perms(head, user, group, mode)
-        except OSError as exc:
-            # be happy if someone already created the path
-            if exc.errno != errno.EEXIST:
-                raise
-        if tail == os.curdir:  # xxx/newdir/. exists if xxx/newdir exists
-            return
-    os.mkdir(name)
-    check_perms(name, None, user, group, int(f"{mode}") if mode else None)
+        head, tail = os.path.split(head)
+    name_tail = tail
+    # Walk up to the first existing parent, collecting the missing ones
+    missing = []
+    while head and tail and not os.path.exists(head):
+        missing.append(head)
+        head, tail = os.path.split(head)
+    # The permissions are applied once all of the directories are in place,
+    # so a restrictive mode on a parent can't get in the way of creating its
+    # children. They are still applied to what was created if a later mkdir
+    # fails.
+    created = []
+    try:
+        for directory in reversed(missing):
+            try:
+                os.mkdir(directory)
+            except OSError as exc:
+                # be happy if someone already created the path
+                if exc.errno != errno.EEXIST:
+                    raise
+            else:
+                created.append(directory)
+        # xxx/newdir/. exists if xxx/newdir exists
+        if not (missing and name_tail == os.curdir):
+            os.mkdir(name)
+            created.append(name)
+    finally:
+        if user is not None or group is not None or mode is not None:
+            for directory in created:
+                check_perms(directory, None, user, group, mode)
+
+
+def _stat_or_none(name):
+    """
+    Return the stat result for a path, or None if it does not exist
+    """
+    try:
+        return os.stat(name)
+    except OSError as exc:
+        if exc.errno == errno.ENOENT:
+            return None
+        raise
+
+
+def _parse_mode(mode):
+    """
+    Return the permission bits of an octal mode passed as a string (``0660``,
+    ``0o660``) or an int (``660``), or None if no mode was given
+    """
+    if not mode:
+        return None
+    return int(str(mode).lstrip("0Oo") or "0", 8)
 
 
 def get_devmm(name):
@@ -7538,8 +7802,10 @@ def get_devmm(name):
     """
     name = os.path.expanduser(name)
 
-    if is_chrdev(name) or is_blkdev(name):
-        stat_structure = os.stat(name)
+    stat_structure = _stat_or_none(name)
+    if stat_structure is not None and (
+        stat.S_ISCHR(stat_structure.st_mode) or stat.S_ISBLK(stat_structure.st_mode)
+    ):
         return (os.major(stat_structure.st_rdev), os.minor(stat_structure.st_rdev))
     else:
         return (0, 0)
@@ -7557,16 +7823,8 @@ def is_chrdev(name):
     """
     name = os.path.expanduser(name)
 
-    stat_structure = None
-    try:
-        stat_structure = os.stat(name)
-    except OSError as exc:
-        if exc.errno == errno.ENOENT:
-            # If the character device does not exist in the first place
-            return False
-        else:
-            raise
-    return stat.S_ISCHR(stat_structure.st_mode)
+    stat_structure = _stat_or_none(name)
+    return stat_structure is not None and stat.S_ISCHR(stat_structure.st_mode)
 
 
 def mknod_chrdev(name, major, minor, user=None, group=None, mode="0660"):
@@ -7582,6 +7840,7 @@ def mknod_chrdev(name, major, minor, user=None, group=None, mode="0660"):
        salt '*' file.mknod_chrdev /dev/chr 180 31
     """
     name = os.path.expanduser(name)
+    perms = _parse_mode(mode)
 
     ret = {"name": name, "changes": {}, "comment": "", "result": False}
     log.debug(
@@ -7599,7 +7858,7 @@ def mknod_chrdev(name, major, minor, user=None, group=None, mode="0660"):
             if (
                 os.mknod(
                     name,
-                    int(str(mode).lstrip("0Oo"), 8) | stat.S_IFCHR,
+                    perms | stat.S_IFCHR,
                     os.makedev(major, minor),
                 )
                 is None
@@ -7614,7 +7873,7 @@ def mknod_chrdev(name, major, minor, user=None, group=None, mode="0660"):
         else:
             ret["comment"] = f"File {name} exists and cannot be overwritten"
     # quick pass at verifying the permissions of the newly created character device
-    check_perms(name, None, user, group, int(f"{mode}") if mode else None)
+    check_perms(name, None, user, group, f"{perms:o}" if perms is not None else None)
     return ret
 
 
@@ -7630,16 +7889,8 @@ def is_blkdev(name):
     """
     name = os.path.expanduser(name)
 
-    stat_structure = None
-    try:
-        stat_structure = os.stat(name)
-    except OSError as exc:
-        if exc.errno == errno.ENOENT:
-            # If the block device does not exist in the first place
-            return False
-        else:
-            raise
-    return stat.S_ISBLK(stat_structure.st_mode)
+    stat_structure = _stat_or_none(name)
+    return stat_structure is not None and stat.S_ISBLK(stat_structure.st_mode)
 
 
 def mknod_blkdev(name, major, minor, user=None, group=None, mode="0660"):
@@ -7655,6 +7906,7 @@ def mknod_blkdev(name, major, minor, user=None, group=None, mode="0660"):
        salt '*' file.mknod_blkdev /dev/blk 8 999
     """
     name = os.path.expanduser(name)
+    perms = _parse_mode(mode)
 
     ret = {"name": name, "changes": {}, "comment": "", "result": False}
     log.debug(
@@ -7672,7 +7924,7 @@ def mknod_blkdev(name, major, minor, user=None, group=None, mode="0660"):
             if (
                 os.mknod(
                     name,
-                    int(str(mode).lstrip("0Oo"), 8) | stat.S_IFBLK,
+                    perms | stat.S_IFBLK,
                     os.makedev(major, minor),
                 )
                 is None
@@ -7687,7 +7939,7 @@ def mknod_blkdev(name, major, minor, user=None, group=None, mode="0660"):
         else:
             ret["comment"] = f"File {name} exists and cannot be overwritten"
     # quick pass at verifying the permissions of the newly created block device
-    check_perms(name, None, user, group, int(f"{mode}") if mode else None)
+    check_perms(name, None, user, group, f"{perms:o}" if perms is not None else None)
     return ret
 
 
@@ -7703,16 +7955,8 @@ def is_fifo(name):
     """
     name = os.path.expanduser(name)
 
-    stat_structure = None
-    try:
-        stat_structure = os.stat(name)
-    except OSError as exc:
-        if exc.errno == errno.ENOENT:
-            # If the fifo does not exist in the first place
-            return False
-        else:
-            raise
-    return stat.S_ISFIFO(stat_structure.st_mode)
+    stat_structure = _stat_or_none(name)
+    return stat_structure is not None and stat.S_ISFIFO(stat_structure.st_mode)
 
 
 def mknod_fifo(name, user=None, group=None, mode="0660"):
@@ -7728,6 +7972,7 @@ def mknod_fifo(name, user=None, group=None, mode="0660"):
        salt '*' file.mknod_fifo /dev/fifo
     """
     name = os.path.expanduser(name)
+    perms = _parse_mode(mode)
 
     ret = {"name": name, "changes": {}, "comment": "", "result": False}
     log.debug("Creating FIFO name: %s", name)
@@ -7736,7 +7981,7 @@ def mknod_fifo(name, user=None, group=None, mode="0660"):
             ret["changes"] = {"new": f"Fifo pipe {name} created."}
             ret["result"] = None
         else:
-            if os.mkfifo(name, int(str(mode).lstrip("0Oo"), 8)) is None:
+            if os.mkfifo(name, perms) is None:
                 ret["changes"] = {"new": f"Fifo pipe {name} created."}
                 ret["result"] = True
     except OSError as exc:
@@ -7746,7 +7991,7 @@ def mknod_fifo(name, user=None, group=None, mode="0660"):
         else:
             ret["comment"] = f"File {name} exists and cannot be overwritten"
     # quick pass at verifying the permissions of the newly created fifo
-    check_perms(name, None, user, group, int(f"{mode}") if mode else None)
+    check_perms(name, None, user, group, f"{perms:o}" if perms is not None else None)
     return ret
 
 
@@ -7781,6 +8026,73 @@ def mknod(name, ntype, major=0, minor=0, user=None, group=None, mode="0600"):
     return ret
 
 
+def _list_backup_entries(path):
+    """
+    Return the minion backups of a file, as a dict mapping the time each of
+    them was taken to its directory entry in the backup cache
+    """
+    bkroot = _get_bkroot()
+    parent_dir, basename = os.path.split(path)
+    if _IS_WINDOWS:
+        # ':' is an illegal filesystem path character on Windows
+        src_dir = parent_dir.replace(":", "_")
+        suffix_fmt = _WIN_BACKUP_SUFFIX_FMT
+    else:
+        src_dir = parent_dir[1:]
+        suffix_fmt = _BACKUP_SUFFIX_FMT
+    prefix = f"{basename}_"
+    # Figure out full path of location of backup file in minion cache
+    bkdir = os.path.join(bkroot, src_dir)
+
+    if not os.path.isdir(bkdir):
+        return {}
+
+    backups = {}
+    with os.scandir(bkdir) as entries:
+        for entry in entries:
+            if not entry.name.startswith(prefix) or not entry.is_file():
+                continue
+            try:
+                timestamp = datetime.datetime.strptime(
+                    entry.name[len(prefix) :], suffix_fmt
+                )
+            except ValueError:
+                # File didn't match the strp format string, so it's not a backup
+                # for this file. Move on to the next one.
+                continue
+            backups[timestamp] = entry
+    return backups
+
+
+def _backup_info(timestamp, entry):
+    """
+    Return the information list_backups reports for a single backup
+    """
+    if _IS_WINDOWS:
+        str_format = "%a %b %d %Y %H-%M-%S.%f"
+    else:
+        str_format = "%a %b %d %Y %H:%M:%S.%f"
+    return {
+        "Backup Time": timestamp.strftime(str_format),
+        "Size": entry.stat().st_size,
+        "Location": entry.path,
+    }
+
+
+def _lookup_backup(path, backup_id):
+    """
+    Return the list_backups information for a single backup of a file, without
+    sorting or stat'ing all of the other ones. Raises KeyError if there is no
+    backup with that id.
+    """
+    backups = _list_backup_entries(path)
+    newest = heapq.nlargest(backup_id + 1, backups)
+    if backup_id < 0 or backup_id >= len(newest):
+        raise KeyError(backup_id)
+    timestamp = newest[backup_id]
+    return _backup_info(timestamp, backups[timestamp])
+
+
 def list_backups(path, limit=None):
     """
     .. versionadded:: 0.17.0
@@ -7809,51 +8121,11 @@ def list_backups(path, limit=None):
         log.error("file.list_backups: 'limit' value must be numeric")
         limit = None
 
-    bkroot = _get_bkroot()
-    parent_dir, basename = os.path.split(path)
-    if salt.utils.platform.is_windows():
-        # ':' is an illegal filesystem path character on Windows
-        src_dir = parent_dir.replace(":", "_")
-    else:
-        src_dir = parent_dir[1:]
-    # Figure out full path of location of backup file in minion cache
-    bkdir = os.path.join(bkroot, src_dir)
-
-    if not os.path.isdir(bkdir):
-        return {}
-
-    files = {}
-    for fname in [
-        x for x in os.listdir(bkdir) if os.path.isfile(os.path.join(bkdir, x))
-    ]:
-        if salt.utils.platform.is_windows():
-            # ':' is an illegal filesystem path character on Windows
-            strpfmt = f"{basename}_%a_%b_%d_%H-%M-%S_%f_%Y"
-        else:
-            strpfmt = f"{basename}_%a_%b_%d_%H:%M:%S_%f_%Y"
-        try:
-            timestamp = datetime.datetime.strptime(fname, strpfmt)
-        except ValueError:
-            # File didn't match the strp format string, so it's not a backup
-            # for this file. Move on to the next one.
-            continue
-        if salt.utils.platform.is_windows():
-            str_format = "%a %b %d %Y %H-%M-%S.%f"
-        else:
-            str_format = "%a %b %d %Y %H:%M:%S.%f"
-        files.setdefault(timestamp, {})["Backup Time"] = timestamp.strftime(str_format)
-        location = os.path.join(bkdir, fname)
-        files[timestamp]["Size"] = os.stat(location).st_size
-        files[timestamp]["Location"] = location
-
-    return dict(
-        list(
-            zip(
-                list(range(len(files))),
-                [files[x] for x in sorted(files, reverse=True)[:limit]],
-            )
-        )
-    )
+    backups = _list_backup_entries(path)
+    return {
+        i: _backup_info(ts, backups[ts])
+        for i, ts in enumerate(sorted(backups, reverse=True)[:limit])
+    }
 
 
 list_backup = salt.utils.functools.alias_function(list_backups, "list_backup")
@@ -7893,43 +8165,35 @@ def list_backups_dir(path, limit=None):
     if not os.path.isdir(bkdir):
         return {}
 
+    # Group the backups by the name of the directory they were taken from
+    buckets = {}
+    with os.scandir(bkdir) as entries:
+        for entry in entries:
+            buckets.setdefault(entry.name.split("_")[0], []).append(entry)
+
     files = {}
-    f = {
-        i: len(list(n))
-        for i, n in itertools.groupby(
-            [x.split("_")[0] for x in sorted(os.listdir(bkdir))]
-        )
-    }
-    ff = os.listdir(bkdir)
-    for i, n in f.items():
+    for basename in sorted(buckets):
         ssfile = {}
-        for x in sorted(ff):
-            basename = x.split("_")[0]
-            if i == basename:
-                strpfmt = f"{basename}_%a_%b_%d_%H:%M:%S_%f_%Y"
-                try:
-                    timestamp = datetime.datetime.strptime(x, strpfmt)
-                except ValueError:
-                    # Folder didn't match the strp format string, so it's not a backup
-                    # for this folder. Move on to the next one.
-                    continue
-                ssfile.setdefault(timestamp, {})["Backup Time"] = timestamp.strftime(
-                    "%a %b %d %Y %H:%M:%S.%f"
-                )
-                location = os.path.join(bkdir, x)
-                ssfile[timestamp]["Size"] = os.stat(location).st_size
-                ssfile[timestamp]["Location"] = location
-
-        sfiles = dict(
-            list(
-                zip(
-                    list(range(n)),
-                    [ssfile[x] for x in sorted(ssfile, reverse=True)[:limit]],
+        prefix = f"{basename}_"
+        for entry in sorted(buckets[basename], key=lambda entry: entry.name):
+            if not entry.name.startswith(prefix):
+                continue
+            try:
+                timestamp = datetime.datetime.strptime(
+                    entry.name[len(prefix) :], _BACKUP_SUFFIX_FMT
                 )
+            except ValueError:
+                # Folder didn't match the strp format string, so it's not a backup
+                # for this folder. Move on to the next one.
+                continue
+            ssfile.setdefault(timestamp, {})["Backup Time"] = timestamp.strftime(
+                "%a %b %d %Y %H:%M:%S.%f"
             )
-        )
-        sefiles = {i: sfiles}
-        files.update(sefiles)
+            ssfile[timestamp]["Size"] = entry.stat().st_size
+            ssfile[timestamp]["Location"] = entry.path
+        files[basename] = {
+            i: ssfile[ts] for i, ts in enumerate(sorted(ssfile, reverse=True)[:limit])
+        }
     return files
 
 
@@ -7957,11 +8221,13 @@ def restore_backup(path, backup_id):
     # Note: This only supports minion backups, so this function will need to be
     # modified if/when master backups are implemented.
     ret = {"result": False, "comment": f"Invalid backup_id '{backup_id}'"}
+    if not (
+        isinstance(backup_id, int)
+        or (isinstance(backup_id, str) and backup_id.isdigit())
+    ):
+        return ret
     try:
-        if len(str(backup_id)) == len(str(int(backup_id))):
-            backup = list_backups(path)[int(backup_id)]
-        else:
-            return ret
+        backup = _lookup_backup(path, int(backup_id))
     except ValueError:
         return ret
     except KeyError:
@@ -7983,7 +8249,7 @@ def restore_backup(path, backup_id):
         )
 
     # Try to set proper ownership
-    if not salt.utils.platform.is_windows():
+    if not _IS_WINDOWS:
         try:
             fstat = os.stat(path)
         except OSError:
@@ -8016,11 +8282,13 @@ def delete_backup(path, backup_id):
     path = os.path.expanduser(path)
 
     ret = {"result": False, "comment": f"Invalid backup_id '{backup_id}'"}
+    if not (
+        isinstance(backup_id, int)
+        or (isinstance(backup_id, str) and backup_id.isdigit())
+    ):
+        return ret
     try:
-        if len(str(backup_id)) == len(str(int(backup_id))):
-            backup = list_backups(path)[int(backup_id)]
-        else:
-            return ret
+        backup = _lookup_backup(path, int(backup_id))
     except ValueError:
         return ret
     except KeyError:
@@ -8118,6 +8386,30 @@ def grep(path, pattern, *opts):
     return ret
 
 
+def _read_fd_links(fd_dir):
+    """
+    Return the targets of the links in a /proc file descriptor directory. The
+    directory is opened once and the links are read relative to it, instead of
+    resolving the full path of every link.
+    """
+    try:
+        dir_fd = os.open(fd_dir, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        # Sometimes PIDs and TIDs disappear before we can query them
+        return []
+    try:
+        links = []
+        for fdname in os.listdir(dir_fd):
+            try:
+                links.append(os.readlink(fdname, dir_fd=dir_fd))
+            except OSError:
+                # The file descriptor has been closed in the meantime
+                continue
+        return links
+    finally:
+        os.close(dir_fd)
+
+
 def open_files(by_pid=False):
     """
     Return a list of all physical open files on the system.
@@ -8129,18 +8421,13 @@ def open_files(by_pid=False):
         salt '*' file.open_files
         salt '*' file.open_files by_pid=True
     """
-    # First we collect valid PIDs
-    pids = {}
-    procfs = os.listdir("/proc/")
-    for pfile in procfs:
-        try:
-            pids[int(pfile)] = []
-        except ValueError:
-            # Not a valid PID, move on
-            pass
+    # First we collect valid PIDs, skipping the non-numeric /proc entries
+    with os.scandir("/proc/") as entries:
+        pids = {int(entry.name): [] for entry in entries if entry.name.isdigit()}
 
     # Then we look at the open files for each PID
     files = {}
+    exists = {}
     for pid in pids:
         ppath = f"/proc/{pid}"
         try:
@@ -8148,37 +8435,39 @@ def open_files(by_pid=False):
         except OSError:
             continue
 
-        # Collect the names of all of the file descriptors
-        fd_ = []
-
-        # try:
-        #    fd_.append(os.path.realpath('{0}/task/{1}exe'.format(ppath, tid)))
-        # except Exception:  # pylint: disable=broad-except
-        #    pass
+        # Collect the names of all of the files the file descriptors point to
+        fd_ = _read_fd_links(f"{ppath}/fd")
 
-        for fpath in os.listdir(f"{ppath}/fd"):
-            fd_.append(f"{ppath}/fd/{fpath}")
+        # All of the threads of a process share the same executable, so it
+        # only needs to be looked up once. The exe link already points to the
+        # resolved path, so a single readlink is enough.
+        try:
+            fd_.append(os.readlink(f"{ppath}/exe"))
+        except OSError:
+            # Kernel threads have no executable, and the process may be gone
+            pass
 
         for tid in tids:
-            try:
-                fd_.append(os.path.realpath(f"{ppath}/task/{tid}/exe"))
-            except OSError:
-                continue
-
-            for tpath in os.listdir(f"{ppath}/task/{tid}/fd"):
-                fd_.append(f"{ppath}/task/{tid}/fd/{tpath}")
+            fd_.extend(_read_fd_links(f"{ppath}/task/{tid}/fd"))
 
         fd_ = sorted(set(fd_))
 
         # Loop through file descriptors and return useful data for each file
-        for fdpath in fd_:
-            # Sometimes PIDs and TIDs disappear before we can query them
-            try:
-                name = os.path.realpath(fdpath)
-                # Running stat on the file cuts out all of the sockets and
-                # deleted files from the list
-                os.stat(name)
-            except OSError:
+        for name in fd_:
+            # Sockets, pipes and the like are not linked to a path but to
+            # something like "socket:[1234]"
+            if not name.startswith("/"):
+                continue
+            # Running stat on the file cuts out all of the deleted files from
+            # the list. Many processes share the same files, so only stat each
+            # of them once.
+            if name not in exists:
+                try:
+                    os.stat(name)
+                    exists[name] = True
+                except OSError:
+                    exists[name] = False
+            if not exists[name]:
                 continue
 
             if name not in files:
@@ -8354,17 +8643,77 @@ def move(src, dst, disallow_copy_and_unlink=False):
     return ret
 
 
-def diskusage(path):
+def _scan_dir(path):
+    """
+    Return the inode and size of the files in a directory, along with the
+    subdirectories to descend into. Like ``os.walk``, symlinks to directories
+    are neither followed nor returned.
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                try:
+                    stat_structure = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat_structure.st_ino, stat_structure.st_size))
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def _count_new_files(files, seen):
+    """
+    Return the total size of the files returned by ``_scan_dir`` whose inode
+    is not in ``seen`` yet, adding them to it, so that hard links are only
+    counted once
+    """
+    size = 0
+    for inode, file_size in files:
+        if inode not in seen:
+            seen.add(inode)
+            size += file_size
+    return size
+
+
+def diskusage(path, include_filesystem_overhead=False):
     """
     Recursively calculate disk usage of path and return it
     in bytes
 
+    path
+        The path to calculate the disk usage of
+
+    include_filesystem_overhead : False
+        If ``path`` is a mount point, return the space used on the whole
+        filesystem as reported by ``statvfs`` instead of walking it. This is
+        much faster on large filesystems, but the result is the allocated
+        space, so it also includes filesystem metadata, files hidden under
+        other mounts and the like, and does not count the apparent size of
+        sparse files.
+
+        .. versionadded:: 3008.0
+
     CLI Example:
 
     .. code-block:: bash
 
         salt '*' file.diskusage /path/to/check
+        salt '*' file.diskusage /var include_filesystem_overhead=True
     """
+    if include_filesystem_overhead and os.path.ismount(path):
+        vfs = os.statvfs(path)
+        return (vfs.f_blocks - vfs.f_bfree) * vfs.f_frsize
 
     total_size = 0
     seen = set()
@@ -8373,21 +8722,31 @@ def diskusage(path):
         ret = stat_structure.st_size
         return ret
 
-    for dirpath, dirnames, filenames in salt.utils.path.os_walk(path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-
-            try:
-                stat_structure = os.stat(fp)
-            except OSError:
-                continue
-
-            if stat_structure.st_ino in seen:
-                continue
-
-            seen.add(stat_structure.st_ino)
-
-            total_size += stat_structure.st_size
+    # Most trees are small enough that starting threads would cost more than
+    # it saves, so walk the first directories in this thread.
+    dirs = [path]
+    for _ in range(_DISKUSAGE_SERIAL_DIRS):
+        if not dirs:
+            break
+        files, subdirs = _scan_dir(dirs.pop())
+        total_size += _count_new_files(files, seen)
+        dirs.extend(subdirs)
+
+    if dirs:
+        # Listing and stat'ing the directories of a large tree is mostly spent
+        # waiting on the filesystem, so the rest of it is spread over a pool of
+        # threads. The results are only merged here, so no locking is needed.
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+            pending = {pool.submit(_scan_dir, subdir) for subdir in dirs}
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    files, subdirs = future.result()
+                    total_size += _count_new_files(files, seen)
+                    pending.update(pool.submit(_scan_dir, subdir) for subdir in subdirs)
 
     ret = total_size
     return ret
@@ -23,17 +23,33 @@ import salt.utils.platform
 import salt.utils.user
 from salt.exceptions import CommandExecutionError, SaltInvocationError
 from salt.modules.file import (
+    _BACKUP_SUFFIX_FMT,
+    _IS_WINDOWS,
+    _WIN_BACKUP_SUFFIX_FMT,
     __clean_tmp,
     _add_flags,
     _assert_occurrence,
+    _backup_info,
     _binary_replace,
+    _check_perms_adapter,
     _check_sig,
+    _commit_file,
+    _copy_and_hash,
     _error,
+    _files_equal,
     _get_bkroot,
+    _get_cached_hash,
+    _get_diff,
     _get_eol,
     _get_flags,
+    _get_source_mode,
+    _is_tmp,
+    _list_backup_entries,
+    _lookup_backup,
     _mkstemp_copy,
+    _new_file_diff,
     _regex_to_static,
+    _same_fs,
     _set_line,
     _set_line_eol,
     _set_line_indent,
@@ -133,6 +149,8 @@ if salt.utils.platform.is_windows():
         )
         _error = namespaced_function(_error, globals())
         _get_bkroot = namespaced_function(_get_bkroot, globals())
+        _list_backup_entries = namespaced_function(_list_backup_entries, globals())
+        _lookup_backup = namespaced_function(_lookup_backup, globals())
         list_backups = namespaced_function(list_backups, globals())
         restore_backup = namespaced_function(restore_backup, globals())
         delete_backup = namespaced_function(delete_backup, globals())
@@ -143,9 +161,15 @@ if salt.utils.platform.is_windows():
         check_managed_changes = namespaced_function(check_managed_changes, globals())
         check_file_meta = namespaced_function(check_file_meta, globals())
         manage_file = namespaced_function(manage_file, globals())
+        _new_file_diff = namespaced_function(_new_file_diff, globals())
+        _check_perms_adapter = namespaced_function(_check_perms_adapter, globals())
         source_list = namespaced_function(source_list, globals())
         file_exists = namespaced_function(file_exists, globals())
         __clean_tmp = namespaced_function(__clean_tmp, globals())
+        _is_tmp = namespaced_function(_is_tmp, globals())
+        _commit_file = namespaced_function(_commit_file, globals())
+        _get_cached_hash = namespaced_function(_get_cached_hash, globals())
+        _get_source_mode = namespaced_function(_get_source_mode, globals())
         directory_exists = namespaced_function(directory_exists, globals())
         touch = namespaced_function(touch, globals())
         contains = namespaced_function(contains, globals())
@@ -158,6 +182,7 @@ if salt.utils.platform.is_windows():
         check_hash = namespaced_function(check_hash, globals())
         get_hash = namespaced_function(get_hash, globals())
         get_diff = namespaced_function(get_diff, globals())
+        _get_diff = namespaced_function(_get_diff, globals())
         line = namespaced_function(line, globals())
         access = namespaced_function(access, globals())
         copy = namespaced_function(copy, globals())
@@ -51,6 +51,11 @@ else:
 
 log = logging.getLogger(__name__)
 
+# Upper bound for a single partial read from a stream. Tornado fills its read
+# buffer in 64 KiB chunks, so asking for less only splits large frames across
+# more read_bytes/feed round trips through the event loop.
+_READ_CHUNK_SIZE = 65536
+
 
 class ClosingError(Exception):
     """ """
@@ -475,7 +480,7 @@ class PublishClient(salt.transport.base.PublishClient):
         to implement timeouts on top of this helper.
         """
         try:
-            byts = await self._stream.read_bytes(4096, partial=True)
+            byts = await self._stream.read_bytes(_READ_CHUNK_SIZE, partial=True)
         except tornado.iostream.StreamClosedError:
             log.trace("Stream closed, reconnecting.")
             stream = self._stream
@@ -827,7 +832,7 @@ class SaltMessageServer(tornado.tcpserver.TCPServer):
         unpacker = salt.utils.msgpack.Unpacker()
         try:
             while True:
-                wire_bytes = await stream.read_bytes(4096, partial=True)
+                wire_bytes = await stream.read_bytes(_READ_CHUNK_SIZE, partial=True)
                 unpacker.feed(wire_bytes)
                 for framed_msg in unpacker:
                     framed_msg = salt.transport.frame.decode_embedded_strs(framed_msg)
@@ -1064,7 +1069,9 @@ class MessageClient:
         unpacker = salt.utils.msgpack.Unpacker()
         while not self._closed and not self._closing:
             try:
-                wire_bytes = await self._stream.read_bytes(4096, partial=True)
+                wire_bytes = await self._stream.read_bytes(
+                    _READ_CHUNK_SIZE, partial=True
+                )
                 unpacker.feed(wire_bytes)
                 for framed_msg in unpacker:
                     framed_msg = salt.transport.frame.decode_embedded_strs(framed_msg)
@@ -1202,13 +1209,71 @@ class Subscriber:
     Client object for use with the TCP publisher server
     """
 
+    # Flush coalesced payloads early once this many bytes are queued
+    write_buffer_limit = 16384
+
     def __init__(self, stream, address):
         self.stream = stream
         self.address = address
         self._closing = False
         self._read_until_future = None
+        self._writes_in_flight = 0
+        self._pending_writes = bytearray()
+        self._pending_future = None
         self.id_ = None
 
+    def write(self, payload):
+        """
+        Write a framed payload to the subscriber's stream.
+
+        Payloads written while a previous write is still in flight are
+        coalesced and handed to the stream as a single write once it
+        completes, or once ``write_buffer_limit`` bytes are queued. The
+        returned future resolves when the payload has been written.
+        """
+        if not self._writes_in_flight:
+            return self._start_write(payload)
+        self._pending_writes += payload
+        if self._pending_future is None:
+            self._pending_future = tornado.concurrent.Future()
+        future = self._pending_future
+        if len(self._pending_writes) >= self.write_buffer_limit:
+            self._flush_pending_writes()
+        return future
+
+    def _start_write(self, payload):
+        future = self.stream.write(payload)
+        self._writes_in_flight += 1
+        future.add_done_callback(self._write_done)
+        return future
+
+    def _write_done(self, future):
+        self._writes_in_flight -= 1
+        if self._writes_in_flight or not self._pending_writes:
+            return
+        exc = future.exception()
+        if exc is not None:
+            # The stream failed, fail the queued payloads instead of writing
+            # them to it
+            self._pending_writes = bytearray()
+            pending_future, self._pending_future = self._pending_future, None
+            pending_future.set_exception(exc)
+            return
+        self._flush_pending_writes()
+
+    def _flush_pending_writes(self):
+        # Hand the buffer itself to the stream and start a new one, instead of
+        # copying it
+        payload = memoryview(self._pending_writes)
+        self._pending_writes = bytearray()
+        pending_future, self._pending_future = self._pending_future, None
+        try:
+            future = self._start_write(payload)
+        except tornado.iostream.StreamClosedError as exc:
+            pending_future.set_exception(exc)
+            return
+        tornado.concurrent.chain_future(future, pending_future)
+
     def close(self):
         if self._closing:
             return
@@ -1289,7 +1354,9 @@ class PubServer(tornado.tcpserver.TCPServer):
         unpacker = salt.utils.msgpack.Unpacker()
         while not self._closing:
             try:
-                client._read_until_future = client.stream.read_bytes(4096, partial=True)
+                client._read_until_future = client.stream.read_bytes(
+                    _READ_CHUNK_SIZE, partial=True
+                )
                 wire_bytes = await client._read_until_future
                 unpacker.feed(wire_bytes)
                 for framed_msg in unpacker:
@@ -1329,6 +1396,9 @@ class PubServer(tornado.tcpserver.TCPServer):
                     self._validate_ssl_and_add_client(stream, address)
                 )
                 return
+        # Publishes are already coalesced per subscriber, so don't let Nagle's
+        # algorithm hold back the tail of a batch waiting for an ACK.
+        stream.set_nodelay(True)
         client = Subscriber(stream, address)
         self.clients.add(client)
         self.io_loop.create_task(self._stream_read(client))
@@ -1353,6 +1423,7 @@ class PubServer(tornado.tcpserver.TCPServer):
                     return
 
                 # Successfully got cert - add client
+                stream.set_nodelay(True)
                 client = Subscriber(stream, address)
                 self.clients.add(client)
                 self.io_loop.create_task(self._stream_read(client))
@@ -1387,6 +1458,9 @@ class PubServer(tornado.tcpserver.TCPServer):
             "TCP PubServer sending payload: topic_list=%r %r", topic_list, package
         )
         payload = salt.transport.frame.frame_msg(package)
+        # Subscribers whose stream turns out to be closed are collected here
+        # and swept once the writes have finished, so ``self.clients`` can be
+        # iterated directly instead of copying it on every publish.
         to_remove = []
         # Start writes to every targeted client concurrently so a single
         # slow subscriber can't stall delivery to the rest of the fleet.
@@ -1396,21 +1470,23 @@ class PubServer(tornado.tcpserver.TCPServer):
         # wedging the master.
         write_futures = []
         if topic_list:
-            for topic in topic_list:
-                sent = False
-                for client in list(self.clients):
-                    if topic == client.id_:
-                        try:
-                            write_futures.append((client, client.stream.write(payload)))
-                            sent = True
-                        except tornado.iostream.StreamClosedError:
-                            to_remove.append(client)
-                if not sent:
-                    log.debug("Publish target %s not connected %r", topic, self.clients)
+            # Match targets in a single pass over the subscribers rather than
+            # rescanning every subscriber for each topic.
+            topics = set(topic_list)
+            sent = set()
+            for client in self.clients:
+                if client.id_ in topics:
+                    try:
+                        write_futures.append((client, client.write(payload)))
+                        sent.add(client.id_)
+                    except tornado.iostream.StreamClosedError:
+                        to_remove.append(client)
+            for topic in topics - sent:
+                log.debug("Publish target %s not connected %r", topic, self.clients)
         else:
-            for client in list(self.clients):
+            for client in self.clients:
                 try:
-                    write_futures.append((client, client.stream.write(payload)))
+                    write_futures.append((client, client.write(payload)))
                 except tornado.iostream.StreamClosedError:
                     to_remove.append(client)
         for client, future in write_futures:
@@ -2107,7 +2183,9 @@ class RequestClient(salt.transport.base.RequestClient):
         unpacker = salt.utils.msgpack.Unpacker()
         while not self._closing:
             try:
-                wire_bytes = await self._stream.read_bytes(4096, partial=True)
+                wire_bytes = await self._stream.read_bytes(
+                    _READ_CHUNK_SIZE, partial=True
+                )
                 unpacker.feed(wire_bytes)
                 for framed_msg in unpacker:
                     framed_msg = salt.transport.frame.decode_embedded_strs(framed_msg)
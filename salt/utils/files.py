@@ -201,6 +201,16 @@ def copyfile(source, dest, backup_mode="", cachedir=""):
     dname = os.path.dirname(os.path.abspath(dest))
     tgt = mkstemp(prefix=bname, dir=dname)
     shutil.copyfile(source, tgt)
+    replacefile(tgt, dest, backup_mode, cachedir)
+
+
+def replacefile(tgt, dest, backup_mode="", cachedir=""):
+    """
+    Move an already written file ``tgt`` into place at ``dest``, backing up
+    the existing destination and keeping its ownership and mode, just like
+    :py:func:`copyfile` does. ``tgt`` should live on the same filesystem as
+    ``dest`` so that the final move is an atomic rename.
+    """
     bkroot = ""
     if cachedir:
         bkroot = os.path.join(cachedir, "file_backup")
@@ -3,7 +3,6 @@ Functions for manipulating or otherwise processing strings
 """
 
 import base64
-import difflib
 import errno
 import fnmatch
 import logging
@@ -522,6 +521,10 @@ def get_diff_list(a, b, *args, **kwargs):
     the diff as a list. Lines are normalized to str types to avoid issues
     with unicode on PY2.
     """
+    # difflib is only needed when a diff is actually requested, so don't make
+    # every importer of this module pay for it
+    import difflib
+
     encoding = ("utf-8", "latin-1", __salt_system_encoding__)
     # Late import to avoid circular import
     import salt.utils.data
@@ -426,6 +426,11 @@ def pytest_configure(config):
         "markers",
         "async_timeout: Timeout, in seconds, for asynchronous test functions(`async def`)",
     )
+    config.addinivalue_line(
+        "markers",
+        "xdist_group(name): Run the tests of a group on the same pytest-xdist worker"
+        " when `--dist=loadgroup` is passed. A no-op without pytest-xdist.",
+    )
     config.addinivalue_line(
         "markers",
         "requires_random_entropy(minimum={}, timeout={}, skip=True): Mark test as "
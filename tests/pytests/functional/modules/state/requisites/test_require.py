@@ -1,4 +1,4 @@
-import datetime
+import contextlib
 import time
 
 import pytest
@@ -8,8 +8,162 @@ from . import normalize_ret
 pytestmark = [
     pytest.mark.windows_whitelisted,
     pytest.mark.core_test,
+    # All of these tests write their SLS files to the same module scoped state
+    # tree, so under `pytest -n auto --dist=loadgroup` they are kept together
+    pytest.mark.xdist_group("requisites_require"),
 ]
 
+_EXPECTED_FULL_SLS_REQUIRE = {
+    "cmd_|-A_|-echo A_|-run": {
+        "__run_num__": 2,
+        "comment": 'Command "echo A" run',
+        "result": True,
+        "changes": True,
+    },
+    "cmd_|-B_|-echo B_|-run": {
+        "__run_num__": 0,
+        "comment": 'Command "echo B" run',
+        "result": True,
+        "changes": True,
+    },
+    "cmd_|-C_|-echo C_|-run": {
+        "__run_num__": 1,
+        "comment": 'Command "echo C" run',
+        "result": True,
+        "changes": True,
+    },
+}
+
+_EXPECTED_REQUIRE_WITH_ORDER_FIRST_LAST = {
+    "test_|-B_|-B_|-succeed_with_changes": {
+        "__run_num__": 0,
+        "result": True,
+        "changes": True,
+        "comment": "Success!",
+    },
+    "test_|-A_|-A_|-succeed_with_changes": {
+        "__run_num__": 1,
+        "result": True,
+        "changes": True,
+        "comment": "Success!",
+    },
+    "test_|-D_|-D_|-succeed_with_changes": {
+        "__run_num__": 2,
+        "result": True,
+        "changes": True,
+        "comment": "Success!",
+    },
+    "test_|-E_|-E_|-succeed_with_changes": {
+        "__run_num__": 3,
+        "result": True,
+        "changes": True,
+        "comment": "Success!",
+    },
+    "test_|-C_|-C_|-succeed_with_changes": {
+        "__run_num__": 4,
+        "result": True,
+        "changes": True,
+        "comment": "Success!",
+    },
+}
+
+_EXPECTED_REQUIRE_ANY = {
+    "cmd_|-A_|-echo A_|-run": {
+        "__run_num__": 3,
+        "comment": 'Command "echo A" run',
+        "result": True,
+        "changes": True,
+    },
+    "cmd_|-B_|-echo B_|-run": {
+        "__run_num__": 0,
+        "comment": 'Command "echo B" run',
+        "result": True,
+        "changes": True,
+    },
+    "cmd_|-C_|-$(which false)_|-run": {
+        "__run_num__": 1,
+        "comment": 'Command "$(which false)" run',
+        "result": False,
+        "changes": True,
+    },
+    "cmd_|-D_|-echo D_|-run": {
+        "__run_num__": 2,
+        "comment": 'Command "echo D" run',
+        "result": True,
+        "changes": True,
+    },
+}
+
+_EXPECTED_ISSUE_59922 = {
+    "cmd_|-A_|-echo A_|-run": {
+        "__run_num__": 2,
+        "comment": 'Command "echo A" run',
+        "result": True,
+        "changes": True,
+    },
+    "test_|-X_|-A_|-succeed_without_changes": {
+        "__run_num__": 1,
+        "comment": "Success!",
+        "result": True,
+        "changes": False,
+    },
+    "cmd_|-B_|-echo B_|-run": {
+        "__run_num__": 0,
+        "comment": 'Command "echo B" run',
+        "result": True,
+        "changes": True,
+    },
+}
+
+_EXPECTED_ISSUE_61121 = {
+    "test_|-A_|-a_|-succeed_without_changes": {
+        "__run_num__": 0,
+        "changes": False,
+        "result": True,
+        "comment": "Success!",
+    },
+    "cmd_|-A_|-echo A_|-run": {
+        "__run_num__": 1,
+        "changes": True,
+        "result": True,
+        "comment": 'Command "echo A" run',
+    },
+}
+
+
+def _start_time_us(state_ret):
+    """
+    Return the start_time of a state return, in microseconds since midnight
+    """
+    hours, minutes, seconds = state_ret["start_time"].split(":")
+    # isoformat() leaves out the fraction when there are no microseconds
+    seconds, _, fraction = seconds.partition(".")
+    seconds = (int(hours) * 60 + int(minutes)) * 60 + int(seconds)
+    return seconds * 1_000_000 + int(fraction.ljust(6, "0"))
+
+
+def _assert_ret_eq(result, expected):
+    """
+    Compare a normalized state run to the expected one, reporting missing and
+    unexpected state IDs before comparing the individual returns
+    """
+    assert len(result) == len(expected), (
+        set(expected) - set(result),
+        set(result) - set(expected),
+    )
+    assert result == expected
+
+
+@contextlib.contextmanager
+def _temp_sls_files(state_tree, files):
+    """
+    Write several SLS files to the state tree for the duration of the context
+    """
+    with contextlib.ExitStack() as stack:
+        for name, contents in files.items():
+            stack.enter_context(pytest.helpers.temp_file(name, contents, state_tree))
+        yield
+
 
 def test_requisites_full_sls_require(state, state_tree):
     """
@@ -32,32 +186,12 @@ def test_requisites_full_sls_require(state, state_tree):
         - require:
           - sls: fullsls
     """
-    expected_result = {
-        "cmd_|-A_|-echo A_|-run": {
-            "__run_num__": 2,
-            "comment": 'Command "echo A" run',
-            "result": True,
-            "changes": True,
-        },
-        "cmd_|-B_|-echo B_|-run": {
-            "__run_num__": 0,
-            "comment": 'Command "echo B" run',
-            "result": True,
-            "changes": True,
-        },
-        "cmd_|-C_|-echo C_|-run": {
-            "__run_num__": 1,
-            "comment": 'Command "echo C" run',
-            "result": True,
-            "changes": True,
-        },
-    }
-    with pytest.helpers.temp_file(
-        "requisite.sls", sls_contents, state_tree
-    ), pytest.helpers.temp_file("fullsls.sls", full_sls_contents, state_tree):
+    with _temp_sls_files(
+        state_tree, {"requisite.sls": sls_contents, "fullsls.sls": full_sls_contents}
+    ):
         ret = state.sls("requisite")
         result = normalize_ret(ret.raw)
-        assert result == expected_result
+        _assert_ret_eq(result, _EXPECTED_FULL_SLS_REQUIRE)
 
 
 def test_requisites_require_no_state_module(state, state_tree):
@@ -142,13 +276,11 @@ def test_requisites_require_no_state_module(state, state_tree):
         assert ret.errors == errmsgs
 
 
-def test_requisites_require_ordering_and_errors_1(state, state_tree):
-    """
-    Call sls file containing several require_in and require.
-
-    Ensure there are errors due to requisites.
-    """
-    sls_contents = """
+@pytest.mark.parametrize(
+    "sls_contents,errmsgs",
+    [
+        pytest.param(
+            """
     # Complex require/require_in graph
     #
     # Relative order of C>E is given by the definition order
@@ -212,61 +344,42 @@ def test_requisites_require_ordering_and_errors_1(state, state_tree):
         - name: echo H
         - require:
           - cmd: Z
-    """
-    errmsgs = [
-        (
-            "Referenced state does not exist for requisite [require: (foobar: A)]"
-            " in state [echo F] in SLS [requisite]"
-        ),
-        (
-            "Referenced state does not exist for requisite [require: (cmd: Z)]"
-            " in state [echo G] in SLS [requisite]"
-        ),
-        (
-            "Referenced state does not exist for requisite [require: (cmd: Z)]"
-            " in state [echo H] in SLS [requisite]"
+    """,
+            [
+                (
+                    "Referenced state does not exist for requisite"
+                    " [require: (foobar: A)] in state [echo F] in SLS [requisite]"
+                ),
+                (
+                    "Referenced state does not exist for requisite"
+                    " [require: (cmd: Z)] in state [echo G] in SLS [requisite]"
+                ),
+                (
+                    "Referenced state does not exist for requisite"
+                    " [require: (cmd: Z)] in state [echo H] in SLS [requisite]"
+                ),
+            ],
+            id="missing-requisites",
         ),
-    ]
-
-    with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
-        ret = state.sls("requisite")
-        assert ret.failed
-        assert ret.errors == errmsgs
-
-
-def test_requisites_require_ordering_and_errors_2(state, state_tree):
-    """
-    Call sls file containing several require_in and require.
-
-    Ensure that some of them are failing and that the order is right.
-    """
-    sls_contents = """
+        pytest.param(
+            """
     # will fail with "Data failed to compile:"
     A:
       cmd.run:
         - name: echo A
         - require_in:
           - foobar: W
-    """
-    errmsg = (
-        "Cannot extend ID 'W' in 'base:requisite'. It is not part of the high"
-        " state.\nThis is likely due to a missing include statement or an incorrectly"
-        " typed ID.\nEnsure that a state with an ID of 'W' is available\nin environment"
-        " 'base' and to SLS 'requisite'"
-    )
-    with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
-        ret = state.sls("requisite")
-        assert ret.failed
-        assert ret.errors == [errmsg]
-
-
-def test_requisites_require_ordering_and_errors_3(state, state_tree):
-    """
-    Call sls file containing several require_in and require.
-
-    Ensure that some of them are failing and that the order is right.
-    """
-    sls_contents = """
+    """,
+            [
+                "Cannot extend ID 'W' in 'base:requisite'. It is not part of the"
+                " high state.\nThis is likely due to a missing include statement or"
+                " an incorrectly typed ID.\nEnsure that a state with an ID of 'W' is"
+                " available\nin environment 'base' and to SLS 'requisite'"
+            ],
+            id="extend-missing-id",
+        ),
+        pytest.param(
+            """
     # issue #8772
     # should fail with "Data failed to compile:"
     B:
@@ -279,26 +392,17 @@ def test_requisites_require_ordering_and_errors_3(state, state_tree):
     A:
       cmd.run:
         - name: echo A first
-    """
-    errmsg = (
-        "Cannot extend ID 'A' in 'base:requisite'. It is not part of the high state.\n"
-        "This is likely due to a missing include statement or an incorrectly typed ID.\n"
-        "Ensure that a state with an ID of 'A' is available\n"
-        "in environment 'base' and to SLS 'requisite'"
-    )
-    with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
-        ret = state.sls("requisite")
-        assert ret.failed
-        assert ret.errors == [errmsg]
-
-
-def test_requisites_require_ordering_and_errors_4(state, state_tree):
-    """
-    Call sls file containing several require_in and require.
-
-    Ensure that some of them are failing and that the order is right.
-    """
-    sls_contents = """
+    """,
+            [
+                "Cannot extend ID 'A' in 'base:requisite'. It is not part of the"
+                " high state.\nThis is likely due to a missing include statement or"
+                " an incorrectly typed ID.\nEnsure that a state with an ID of 'A' is"
+                " available\nin environment 'base' and to SLS 'requisite'"
+            ],
+            id="issue-8772",
+        ),
+        pytest.param(
+            """
     A:
       cmd.run:
         - name: echo A
@@ -314,28 +418,19 @@ def test_requisites_require_ordering_and_errors_4(state, state_tree):
         # here used without "-"
         - require_in:
             cmd: A
-    """
-    # issue #8235
-    # FIXME: Why is require enforcing list syntax while require_in does not?
-    # And why preventing it?
-    # Currently this state fails, should return C/B/A
-    errmsg = (
-        "The require statement in state 'B' in SLS 'requisite' needs to be formed as a"
-        " list"
-    )
-    with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
-        ret = state.sls("requisite")
-        assert ret.failed
-        assert ret.errors == [errmsg]
-
-
-def test_requisites_require_ordering_and_errors_5(state, state_tree):
-    """
-    Call sls file containing several require_in and require.
-
-    Ensure that some of them are failing and that the order is right.
-    """
-    sls_contents = """
+    """,
+            # issue #8235
+            # FIXME: Why is require enforcing list syntax while require_in does not?
+            # And why preventing it?
+            # Currently this state fails, should return C/B/A
+            [
+                "The require statement in state 'B' in SLS 'requisite' needs to be"
+                " formed as a list"
+            ],
+            id="issue-8235",
+        ),
+        pytest.param(
+            """
     A:
       cmd.run:
         - name: echo A
@@ -347,18 +442,30 @@ def test_requisites_require_ordering_and_errors_5(state, state_tree):
         - name: echo B
         - require:
           - cmd: A
+    """,
+            [
+                "Recursive requisites were found: "
+                "({'SLS': 'requisite', 'ID': 'B', 'NAME': 'echo B'}, "
+                "'require', {'SLS': 'requisite', 'ID': 'A', 'NAME': 'echo A'}), "
+                "({'SLS': 'requisite', 'ID': 'A', 'NAME': 'echo A'}, 'require', "
+                "{'SLS': 'requisite', 'ID': 'B', 'NAME': 'echo B'})"
+            ],
+            id="recursive-requisites",
+        ),
+    ],
+)
+def test_requisites_require_ordering_and_errors(
+    state, state_tree, sls_contents, errmsgs
+):
+    """
+    Call sls file containing several require_in and require.
+
+    Ensure that some of them are failing and that the order is right.
     """
-    errmsg = (
-        "Recursive requisites were found: "
-        "({'SLS': 'requisite', 'ID': 'B', 'NAME': 'echo B'}, "
-        "'require', {'SLS': 'requisite', 'ID': 'A', 'NAME': 'echo A'}), "
-        "({'SLS': 'requisite', 'ID': 'A', 'NAME': 'echo A'}, 'require', "
-        "{'SLS': 'requisite', 'ID': 'B', 'NAME': 'echo B'})"
-    )
     with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
         ret = state.sls("requisite")
         assert ret.failed
-        assert ret.errors == [errmsg]
+        assert ret.errors == errmsgs
 
 
 def test_requisites_require_with_order_first_last(state, state_tree):
@@ -405,42 +512,10 @@ def test_requisites_require_with_order_first_last(state, state_tree):
     E:
       test.succeed_with_changes
     """
-    expected_result = {
-        "test_|-B_|-B_|-succeed_with_changes": {
-            "__run_num__": 0,
-            "result": True,
-            "changes": True,
-            "comment": "Success!",
-        },
-        "test_|-A_|-A_|-succeed_with_changes": {
-            "__run_num__": 1,
-            "result": True,
-            "changes": True,
-            "comment": "Success!",
-        },
-        "test_|-D_|-D_|-succeed_with_changes": {
-            "__run_num__": 2,
-            "result": True,
-            "changes": True,
-            "comment": "Success!",
-        },
-        "test_|-E_|-E_|-succeed_with_changes": {
-            "__run_num__": 3,
-            "result": True,
-            "changes": True,
-            "comment": "Success!",
-        },
-        "test_|-C_|-C_|-succeed_with_changes": {
-            "__run_num__": 4,
-            "result": True,
-            "changes": True,
-            "comment": "Success!",
-        },
-    }
     with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
         ret = state.sls("requisite")
         result = normalize_ret(ret.raw)
-        assert result == expected_result
+        _assert_ret_eq(result, _EXPECTED_REQUIRE_WITH_ORDER_FIRST_LAST)
 
 
 def test_requisites_require_any(state, state_tree):
@@ -485,36 +560,10 @@ def test_requisites_require_any(state, state_tree):
       cmd.run:
         - name: echo D
     """
-    expected_result = {
-        "cmd_|-A_|-echo A_|-run": {
-            "__run_num__": 3,
-            "comment": 'Command "echo A" run',
-            "result": True,
-            "changes": True,
-        },
-        "cmd_|-B_|-echo B_|-run": {
-            "__run_num__": 0,
-            "comment": 'Command "echo B" run',
-            "result": True,
-            "changes": True,
-        },
-        "cmd_|-C_|-$(which false)_|-run": {
-            "__run_num__": 1,
-            "comment": 'Command "$(which false)" run',
-            "result": False,
-            "changes": True,
-        },
-        "cmd_|-D_|-echo D_|-run": {
-            "__run_num__": 2,
-            "comment": 'Command "echo D" run',
-            "result": True,
-            "changes": True,
-        },
-    }
     with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
         ret = state.sls("requisite")
         result = normalize_ret(ret.raw)
-        assert result == expected_result
+        _assert_ret_eq(result, _EXPECTED_REQUIRE_ANY)
 
 
 def test_requisites_require_any_fail(state, state_tree):
@@ -579,26 +628,31 @@ def test_issue_38683_require_order_failhard_combination(state, state_tree):
 
 
 @pytest.mark.skip_on_windows
+@pytest.mark.xdist_group("requisites_require_parallel")
 def test_parallel_state_with_requires(state, state_tree):
     """
     This is a test case for https://github.com/saltstack/salt/issues/49273
     Parallel state object has any requisites
     """
-    sls_contents = """
-    barrier:
-      cmd.run:
-        - name: sleep 1
-
-    {%- for x in range(1, 10) %}
-    blah-{{x}}:
+    # The parallel states are spelled out here instead of being generated by
+    # a Jinja loop, so rendering the SLS file has no template logic to run
+    blah_states = "".join(
+        f"""
+    blah-{x}:
       cmd.run:
         - name: sleep 2
         - require:
           - barrier
           - barrier2
         - parallel: true
-    {% endfor %}
-
+"""
+        for x in range(1, 10)
+    )
+    sls_contents = f"""
+    barrier:
+      cmd.run:
+        - name: sleep 1
+    {blah_states}
     barrier2:
       test.nop
     """
@@ -621,6 +675,7 @@ def test_parallel_state_with_requires(state, state_tree):
 
 
 @pytest.mark.skip_on_windows
+@pytest.mark.xdist_group("requisites_require_parallel")
 def test_parallel_state_with_requires_on_parallel(state, state_tree):
     """
     Parallel states requiring other parallel states should not block
@@ -661,51 +716,39 @@ def test_parallel_state_with_requires_on_parallel(state, state_tree):
             "requisite_parallel",
             __pub_jid="1",  # Because these run in parallel we need a fake JID)
         )
-        start_b1 = datetime.datetime.combine(
-            datetime.date.today(),
-            datetime.time.fromisoformat(
-                ret["cmd_|-service_b1_|-sleep 5_|-run"]["start_time"]
-            ),
-        )
-        start_c = datetime.datetime.combine(
-            datetime.date.today(),
-            datetime.time.fromisoformat(
-                ret["cmd_|-service_c_|-true_|-run"]["start_time"]
-            ),
-        )
+        start_b1 = _start_time_us(ret["cmd_|-service_b1_|-sleep 5_|-run"])
+        start_c = _start_time_us(ret["cmd_|-service_c_|-true_|-run"])
         start_diff = start_c - start_b1
         # Expected order:
         #   a > (b1, c) > b2
         # When b2 blocks while waiting for b1, c has to wait for b1 as well.
         # c should approximately start at the same time as b1 though.
-        assert start_diff < datetime.timedelta(seconds=5)  # b1 sleeps for 5 seconds
+        assert start_diff < 5_000_000  # b1 sleeps for 5 seconds
         for state_ret in ret.raw.values():
             assert "__parallel__" in state_ret
 
 
 @pytest.mark.skip_on_windows
-def test_regular_state_requires_parallel(state, state_tree, tmp_path):
+@pytest.mark.xdist_group("requisites_require_parallel")
+def test_regular_state_requires_parallel(state, state_tree):
     """
     Regular states requiring parallel states should block until all
     requisites are executed.
     """
-    tmpfile = tmp_path / "foo"
-    sls_contents = f"""
+    sls_contents = """
         service_a:
           cmd.run:
               - name: sleep 3
               - parallel: True
 
         service_b:
-          cmd.run:
-              - name: 'touch {tmpfile}'
+          test.succeed_with_changes:
               - parallel: True
               - require:
                   - service_a
 
         service_c:
-          cmd.run:
-              - name: 'test -f {tmpfile}'
+          test.succeed_without_changes:
               - require:
                   - service_b
     """
@@ -715,7 +758,12 @@ def test_regular_state_requires_parallel(state, state_tree, tmp_path):
             "requisite_parallel_2",
             __pub_jid="1",  # Because these run in parallel we need a fake JID)
         )
-        assert ret[f"cmd_|-service_c_|-test -f {tmpfile}_|-run"]["result"] is True
+        service_b = ret["test_|-service_b_|-service_b_|-succeed_with_changes"]
+        service_c = ret["test_|-service_c_|-service_c_|-succeed_without_changes"]
+        assert service_c["result"] is True
+        # service_c must only have started once service_b was done
+        end_b = _start_time_us(service_b) + service_b["duration"] * 1000
+        assert _start_time_us(service_c) >= end_b
 
 
 def test_issue_59922_conflict_in_name_and_id_for_require_in(state, state_tree):
@@ -739,30 +787,10 @@ def test_issue_59922_conflict_in_name_and_id_for_require_in(state, state_tree):
         - require_in:
           - test: A
     """
-    expected_result = {
-        "cmd_|-A_|-echo A_|-run": {
-            "__run_num__": 2,
-            "comment": 'Command "echo A" run',
-            "result": True,
-            "changes": True,
-        },
-        "test_|-X_|-A_|-succeed_without_changes": {
-            "__run_num__": 1,
-            "comment": "Success!",
-            "result": True,
-            "changes": False,
-        },
-        "cmd_|-B_|-echo B_|-run": {
-            "__run_num__": 0,
-            "comment": 'Command "echo B" run',
-            "result": True,
-            "changes": True,
-        },
-    }
     with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
         ret = state.sls("requisite")
         result = normalize_ret(ret.raw)
-        assert result == expected_result
+        _assert_ret_eq(result, _EXPECTED_ISSUE_59922)
 
 
 def test_issue_61121_extend_is_to_strict(state, state_tree):
@@ -781,24 +809,10 @@ def test_issue_61121_extend_is_to_strict(state, state_tree):
           - run
           - name: echo A
     """
-    expected_result = {
-        "test_|-A_|-a_|-succeed_without_changes": {
-            "__run_num__": 0,
-            "changes": False,
-            "result": True,
-            "comment": "Success!",
-        },
-        "cmd_|-A_|-echo A_|-run": {
-            "__run_num__": 1,
-            "changes": True,
-            "result": True,
-            "comment": 'Command "echo A" run',
-        },
-    }
     with pytest.helpers.temp_file("requisite.sls", sls_contents, state_tree):
         ret = state.sls("requisite")
         result = normalize_ret(ret.raw)
-        assert result == expected_result
+        _assert_ret_eq(result, _EXPECTED_ISSUE_61121)
 
 
 def test_issue_30971_sls_empty_output_requisite_not_found(state, state_tree):
@@ -829,9 +843,10 @@ def test_issue_30971_sls_empty_output_requisite_not_found(state, state_tree):
           - sls: empty_sls
     """
 
-    with pytest.helpers.temp_file(
-        "empty_sls.sls", empty_sls_contents, state_tree
-    ), pytest.helpers.temp_file("requiring.sls", requiring_sls_contents, state_tree):
+    with _temp_sls_files(
+        state_tree,
+        {"empty_sls.sls": empty_sls_contents, "requiring.sls": requiring_sls_contents},
+    ):
         ret = state.sls("requiring")
         for state_return in ret:
             assert (
@@ -838,3 +838,22 @@ def test_send_aes_key_event_finds_peer_pub_with_bare_name(cluster_master_opts):
         "'Peer key missing' for every configured cluster_peer and is the "
         "root cause of issue #68462."
     )
+
+
+def test_pub_server_channel_reuses_crypticle_until_aes_rotation(master_opts):
+    channel = server.PubServerChannel.__new__(server.PubServerChannel)
+    channel.opts = master_opts
+    channel.crypticle = None
+    first_key = salt.crypt.Crypticle.generate_key_string()
+    second_key = salt.crypt.Crypticle.generate_key_string()
+    secret = MagicMock()
+    secret.value = first_key
+    with patch.dict(SMaster.secrets, {"aes": {"secret": secret}}):
+        crypticle = channel._aes_crypticle()
+        assert crypticle.key_string == first_key
+        assert channel._aes_crypticle() is crypticle
+
+        secret.value = second_key
+        rotated = channel._aes_crypticle()
+        assert rotated is not crypticle
+        assert rotated.key_string == second_key
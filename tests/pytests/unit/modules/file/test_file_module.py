@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import os
 import re
@@ -16,7 +17,7 @@ import salt.utils.files
 import salt.utils.platform
 import salt.utils.stringutils
 from salt.utils.jinja import SaltCacheLoader
-from tests.support.mock import MagicMock, Mock, patch
+from tests.support.mock import MagicMock, Mock, call, patch
 
 log = logging.getLogger(__name__)
 
@@ -606,3 +607,346 @@ def test_file_move_disallow_copy_and_unlink():
         mock_os_rename.assert_called_once()
         mock_shutil_move.assert_not_called()
         assert ret is True
+
+
+def test_copy_and_hash(tmp_path):
+    src = tmp_path / "src"
+    dst = tmp_path / "dst"
+    data = os.urandom(1024 * 1024 + 17)
+    src.write_bytes(data)
+    ret = filemod._copy_and_hash(str(src), str(dst), "sha256", chunk_size=4096)
+    assert ret == hashlib.sha256(data).hexdigest()
+    assert dst.read_bytes() == data
+
+
+def test_new_file_diff(tmp_path):
+    text = tmp_path / "text"
+    text.write_text("foo\nbar\n")
+    empty = tmp_path / "empty"
+    empty.write_text("")
+    binary = tmp_path / "binary"
+    binary.write_bytes(b"\xd4\xb2\xa6W\xc6\x8e\xf5\x0f")
+
+    with patch.dict(filemod.__utils__, {"files.is_text": salt.utils.files.is_text}):
+        ret = filemod._new_file_diff(str(text))
+        assert ret == "--- \n+++ \n@@ -0,0 +1,2 @@\n+foo\n+bar\n"
+        assert filemod._new_file_diff(str(empty)) == ""
+        ret = filemod._new_file_diff(str(binary))
+        assert ret == "Replace text file with binary file"
+
+
+def test_commit_file(tmp_path):
+    dest = tmp_path / "dest"
+    tmp = tmp_path / f"{salt.utils.files.TEMPFILE_PREFIX}contents"
+    tmp.write_text("new")
+    src = tmp_path / "src"
+    src.write_text("cached")
+
+    with patch("tempfile.gettempdir", MagicMock(return_value=str(tmp_path))):
+        # Temp files get moved into place
+        with patch("salt.utils.files.copyfile") as copyfile:
+            filemod._commit_file(str(tmp), str(dest))
+            copyfile.assert_not_called()
+        assert dest.read_text() == "new"
+        assert not tmp.exists()
+
+        # Anything else is copied
+        filemod._commit_file(str(src), str(dest))
+        assert dest.read_text() == "cached"
+        assert src.exists()
+
+
+def test_files_equal(tmp_path):
+    data = os.urandom(4096)
+    file1 = tmp_path / "file1"
+    file1.write_bytes(data)
+    file2 = tmp_path / "file2"
+    file2.write_bytes(data)
+    file3 = tmp_path / "file3"
+    file3.write_bytes(data[:-1] + bytes([data[-1] ^ 1]))
+    empty1 = tmp_path / "empty1"
+    empty1.write_bytes(b"")
+    empty2 = tmp_path / "empty2"
+    empty2.write_bytes(b"")
+
+    assert filemod._files_equal(str(file1), str(file2), chunk_size=1000) is True
+    assert filemod._files_equal(str(file1), str(file3), chunk_size=1000) is False
+    assert filemod._files_equal(str(file1), str(empty1)) is False
+    assert filemod._files_equal(str(empty1), str(empty2)) is True
+
+
+def test_get_diff_check_identical(tmp_path):
+    file1 = tmp_path / "file1"
+    file1.write_text("same\n")
+    file2 = tmp_path / "file2"
+    file2.write_text("same\n")
+    cache_file = MagicMock(side_effect=lambda path, *args, **kwargs: path)
+    files_equal = MagicMock(return_value=True)
+    with patch.dict(filemod.__salt__, {"cp.cache_file": cache_file}), patch.object(
+        filemod, "_files_equal", files_equal
+    ):
+        assert filemod.get_diff(str(file1), str(file2)) == ""
+        files_equal.assert_called_once_with(str(file1), str(file2))
+
+        files_equal.reset_mock()
+        assert filemod._get_diff(str(file1), str(file2), check_identical=False) == ""
+        files_equal.assert_not_called()
+
+
+def test_get_cached_hash(tmp_path):
+    path = tmp_path / "cached"
+    path.write_text("foo")
+    with patch.object(filemod, "get_hash", wraps=filemod.get_hash) as get_hash:
+        first = filemod._get_cached_hash(str(path), "sha256")
+        assert filemod._get_cached_hash(str(path), "sha256") == first
+        assert get_hash.call_count == 1
+
+        # Modifying the file invalidates the cached hash
+        path.write_text("foobar")
+        ret = filemod._get_cached_hash(str(path), "sha256")
+        assert ret == hashlib.sha256(b"foobar").hexdigest()
+        assert get_hash.call_count == 2
+
+
+@pytest.mark.skip_on_windows(reason="Windows backups use a different name format")
+def test_list_backups(tmp_path):
+    bkroot = tmp_path / "file_backup"
+    bkdir = bkroot / "etc"
+    bkdir.mkdir(parents=True)
+    older = bkdir / "foo.conf_Mon_Jan_01_10:00:00_000001_2024"
+    older.write_text("old")
+    newer = bkdir / "foo.conf_Tue_Jan_02_10:00:00_000002_2024"
+    newer.write_text("newer")
+    (bkdir / "bar.conf_Tue_Jan_02_10:00:00_000002_2024").write_text("bar")
+    (bkdir / "foo.conf").write_text("not a backup")
+
+    expected = {
+        0: {
+            "Backup Time": "Tue Jan 02 2024 10:00:00.000002",
+            "Size": 5,
+            "Location": str(newer),
+        },
+        1: {
+            "Backup Time": "Mon Jan 01 2024 10:00:00.000001",
+            "Size": 3,
+            "Location": str(older),
+        },
+    }
+    with patch.object(filemod, "_get_bkroot", MagicMock(return_value=str(bkroot))):
+        assert filemod.list_backups("/etc/foo.conf") == expected
+        assert filemod.list_backups("/etc/foo.conf", limit=1) == {0: expected[0]}
+        assert filemod.list_backups("/etc/baz.conf") == {}
+        assert filemod.list_backups("/var/foo.conf") == {}
+
+
+def test_diskusage(tmp_path):
+    subdir = tmp_path / "subdir"
+    subdir.mkdir()
+    (tmp_path / "file1").write_bytes(b"x" * 100)
+    (subdir / "file2").write_bytes(b"x" * 50)
+    # Hard links are only counted once
+    os.link(str(tmp_path / "file1"), str(subdir / "hardlink"))
+    assert filemod.diskusage(str(tmp_path)) == 150
+    assert filemod.diskusage(str(tmp_path / "file1")) == 100
+    assert filemod.diskusage(str(tmp_path / "missing")) == 0
+
+
+def test_diskusage_thread_pool(tmp_path):
+    for idx in range(5):
+        subdir = tmp_path / f"subdir{idx}"
+        subdir.mkdir()
+        (subdir / "file").write_bytes(b"x" * 10)
+        (subdir / "nested").mkdir()
+        (subdir / "nested" / "file").write_bytes(b"x" * 5)
+    with patch("concurrent.futures.ThreadPoolExecutor") as executor:
+        assert filemod.diskusage(str(tmp_path)) == 75
+    # A small tree is walked without starting any threads
+    executor.assert_not_called()
+
+    # The rest of a larger tree is handed to the pool
+    with patch.object(filemod, "_DISKUSAGE_SERIAL_DIRS", 2):
+        assert filemod.diskusage(str(tmp_path)) == 75
+
+
+@pytest.mark.skip_on_windows(reason="os.statvfs is not available on Windows")
+def test_diskusage_include_filesystem_overhead(tmp_path):
+    vfs = os.statvfs_result((4096, 4096, 1000, 400, 300, 0, 0, 0, 0, 255))
+    with patch("os.path.ismount", return_value=True), patch(
+        "os.statvfs", return_value=vfs
+    ):
+        ret = filemod.diskusage(str(tmp_path), include_filesystem_overhead=True)
+    assert ret == 600 * 4096
+    # Without the flag a mount point is still walked
+    (tmp_path / "file1").write_bytes(b"x" * 100)
+    with patch("os.path.ismount", return_value=True):
+        assert filemod.diskusage(str(tmp_path)) == 100
+
+
+def test_makedirs_perms(tmp_path):
+    name = tmp_path / "a" / "b" / "c"
+    with patch.object(filemod, "check_perms") as mock_check_perms:
+        filemod.makedirs_perms(str(name), "root", "root", "0750")
+    assert name.is_dir()
+    assert mock_check_perms.call_args_list == [
+        call(str(tmp_path / "a"), None, "root", "root", "750"),
+        call(str(tmp_path / "a" / "b"), None, "root", "root", "750"),
+        call(str(name), None, "root", "root", "750"),
+    ]
+
+    # The requested directory must not already exist
+    with patch.object(filemod, "check_perms") as mock_check_perms:
+        with pytest.raises(FileExistsError):
+            filemod.makedirs_perms(str(name))
+    mock_check_perms.assert_not_called()
+
+
+@pytest.fixture
+def web_source_file(tmp_path):
+    target_dir = tmp_path / "target"
+    target_dir.mkdir()
+    name = target_dir / "foo"
+    name.write_text("old\n")
+    cachedir = tmp_path / "cache"
+    cachedir.mkdir()
+    sfn = cachedir / "downloaded"
+    sfn.write_text("new\n")
+    source_sum = {
+        "hash_type": "sha256",
+        "hsum": hashlib.sha256(b"new\n").hexdigest(),
+    }
+    salt_dunder = {
+        "cp.cache_file": MagicMock(return_value=str(sfn)),
+        "config.backup_mode": MagicMock(return_value=""),
+        "config.option": MagicMock(return_value=False),
+    }
+    with patch.dict(filemod.__salt__, salt_dunder), patch.dict(
+        filemod.__opts__, {"cachedir": str(cachedir), "hash_type": "sha256"}
+    ):
+        yield name, sfn, source_sum
+
+
+def _manage_web_source(name, sfn, source_sum):
+    return filemod.manage_file(
+        str(name),
+        str(sfn),
+        {"name": str(name), "changes": {}, "comment": "", "result": True},
+        "https://example.com/foo",
+        source_sum,
+        None,
+        None,
+        None,
+        None,
+        "base",
+        None,
+    )
+
+
+@pytest.mark.skip_on_windows(reason="Not applicable on Windows")
+def test_manage_file_web_source_staged_outside_target_dir(web_source_file):
+    name, sfn, source_sum = web_source_file
+    staged_dirs = []
+    orig_copy_and_hash = filemod._copy_and_hash
+
+    def copy_and_hash(src, dst, form):
+        staged_dirs.append(os.path.dirname(dst))
+        return orig_copy_and_hash(src, dst, form)
+
+    with patch.object(filemod, "_copy_and_hash", copy_and_hash):
+        ret = _manage_web_source(name, sfn, source_sum)
+    assert ret["result"] is True, ret
+    assert name.read_text() == "new\n"
+    assert staged_dirs == [filemod.__opts__["cachedir"]]
+    assert os.listdir(name.parent) == ["foo"]
+    assert os.listdir(sfn.parent) == ["downloaded"]
+
+
+@pytest.mark.skip_on_windows(reason="Not applicable on Windows")
+def test_manage_file_web_source_hash_mismatch_cleans_up(web_source_file):
+    name, sfn, source_sum = web_source_file
+    source_sum["hsum"] = hashlib.sha256(b"other\n").hexdigest()
+    ret = _manage_web_source(name, sfn, source_sum)
+    assert ret["result"] is False
+    assert "does not match actual checksum" in ret["comment"]
+    assert name.read_text() == "old\n"
+    assert os.listdir(name.parent) == ["foo"]
+    assert os.listdir(sfn.parent) == ["downloaded"]
+
+
+@pytest.mark.skip_on_windows(reason="Not applicable on Windows")
+def test_manage_file_web_source_replace_error_cleans_up(web_source_file):
+    name, sfn, source_sum = web_source_file
+    with patch(
+        "salt.utils.files.replacefile", MagicMock(side_effect=RuntimeError("boom"))
+    ):
+        with pytest.raises(RuntimeError):
+            _manage_web_source(name, sfn, source_sum)
+    assert name.read_text() == "old\n"
+    assert os.listdir(name.parent) == ["foo"]
+    assert os.listdir(sfn.parent) == ["downloaded"]
+
+
+@pytest.mark.skip_on_windows(reason="Not applicable on Windows")
+def test_manage_file_keep_mode_follows_source_mode(tmp_path):
+    source = tmp_path / "source"
+    source.write_text("content\n")
+    name = tmp_path / "name"
+    name.write_text("content\n")
+    source_sum = {
+        "hash_type": "sha256",
+        "hsum": hashlib.sha256(b"content\n").hexdigest(),
+    }
+    stat_file = MagicMock(
+        side_effect=lambda path, **kwargs: salt.utils.files.st_mode_to_octal(
+            os.stat(path).st_mode
+        )
+    )
+    salt_dunder = {
+        "cp.cache_file": MagicMock(return_value=str(source)),
+        "cp.stat_file": stat_file,
+        "config.backup_mode": MagicMock(return_value=""),
+        "config.option": MagicMock(return_value=False),
+    }
+
+    def _manage():
+        return filemod.manage_file(
+            str(name),
+            str(source),
+            {"name": str(name), "changes": {}, "comment": "", "result": True},
+            str(source),
+            source_sum,
+            None,
+            None,
+            None,
+            None,
+            "base",
+            None,
+            keep_mode=True,
+        )
+
+    with patch.dict(filemod.__salt__, salt_dunder), patch.dict(
+        filemod.__opts__, {"hash_type": "sha256"}
+    ), patch.dict(filemod.__context__, {"fileclient": MagicMock()}):
+        source.chmod(0o640)
+        assert _manage()["result"] is True
+        assert name.stat().st_mode & 0o777 == 0o640
+
+        # A later call within the same state run reuses the source's mode
+        _manage()
+        assert stat_file.call_count == 1
+
+        # The next state run has its own file client, and picks up the new
+        # mode of the source
+        source.chmod(0o600)
+        filemod.__context__["fileclient"] = MagicMock()
+        assert _manage()["result"] is True
+        assert name.stat().st_mode & 0o777 == 0o600
+        assert stat_file.call_count == 2
+
+    # Outside of a state run the mode is never remembered
+    with patch.dict(filemod.__salt__, salt_dunder), patch.dict(
+        filemod.__opts__, {"hash_type": "sha256"}
+    ):
+        source.chmod(0o644)
+        assert _manage()["result"] is True
+        assert name.stat().st_mode & 0o777 == 0o644
+        assert stat_file.call_count == 3
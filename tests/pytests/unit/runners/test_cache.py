@@ -10,9 +10,16 @@ import salt.utils.master
 from tests.support.mock import patch
 
 
+@pytest.fixture(scope="module")
+def default_master_config():
+    # Building the default master configuration is comparatively expensive, so
+    # only do it once and hand each test its own copy
+    return salt.config.master_config(None)
+
+
 @pytest.fixture
-def configure_loader_modules(tmp_path):
-    master_config = salt.config.master_config(None)
+def configure_loader_modules(tmp_path, default_master_config):
+    master_config = default_master_config.copy()
     master_config.update(
         {
             "cache": "localfs",
@@ -15,6 +15,23 @@ def configure_loader_modules():
     return {ssh_known_hosts: {}}
 
 
+def _patch_isabs():
+    """
+    Patch os.path.isabs to report every path as relative. Nothing checks the
+    calls, so a plain function is patched in instead of a MagicMock.
+    """
+    return patch.object(os.path, "isabs", lambda path: False)
+
+
+def _seq(*values):
+    """
+    Return a function handing out one of values per call, like a MagicMock
+    with a side_effect list but without the call recording
+    """
+    values = iter(values)
+    return lambda *args, **kwargs: next(values)
+
+
 def test_present():
     """
     Test to verify that the specified host is known by the specified user.
@@ -29,7 +46,7 @@ def test_present():
     ret = {"name": name, "changes": {}, "result": False, "comment": ""}
 
     with patch.dict(ssh_known_hosts.__opts__, {"test": True}):
-        with patch.object(os.path, "isabs", MagicMock(return_value=False)):
+        with _patch_isabs():
             comt = 'If not specifying a "user", specify an absolute "config".'
             ret.update({"comment": comt})
             assert ssh_known_hosts.present(name) == ret
@@ -42,7 +59,7 @@ def test_present():
         ret.update({"comment": comt})
         assert ssh_known_hosts.present(name, user, key=key) == ret
 
-        mock = MagicMock(side_effect=["exists", "add", "update"])
+        mock = _seq("exists", "add", "update")
         with patch.dict(ssh_known_hosts.__salt__, {"ssh.check_known_host": mock}):
             comt = f"Host github.com is already in {config}"
             ret.update({"comment": comt, "result": True})
@@ -113,7 +130,7 @@ def test_absent():
 
     ret = {"name": name, "changes": {}, "result": False, "comment": ""}
 
-    with patch.object(os.path, "isabs", MagicMock(return_value=False)):
+    with _patch_isabs():
         comt = 'If not specifying a "user", specify an absolute "config".'
         ret.update({"comment": comt})
         assert ssh_known_hosts.absent(name) == ret
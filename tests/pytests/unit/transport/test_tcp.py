@@ -2,7 +2,6 @@ import asyncio
 import gc
 import os
 import socket
-import warnings
 import weakref
 
 import attr
@@ -14,10 +13,12 @@ import tornado.iostream
 from pytestshellutils.utils import ports
 
 import salt.channel.server
+import salt.crypt
 import salt.exceptions
+import salt.master
 import salt.transport.tcp
 import salt.utils.platform
-from tests.support.mock import MagicMock, PropertyMock, patch
+from tests.support.mock import MagicMock, call, patch
 
 pytestmark = [
     pytest.mark.core_test,
@@ -38,19 +39,15 @@ def fake_crypto():
 
 @pytest.fixture
 def _fake_authd(io_loop):
-    async def return_nothing(*args, **kwargs):
+    async def authenticate(self, *args, **kwargs):
         return None
 
-    with patch(
-        "salt.crypt.AsyncAuth.authenticated", new_callable=PropertyMock
-    ) as mock_authed, patch(
-        "salt.crypt.AsyncAuth.authenticate",
-        autospec=True,
-        side_effect=return_nothing,
-    ), patch(
-        "salt.crypt.AsyncAuth.gen_token", autospec=True, return_value=42
-    ):
-        mock_authed.return_value = False
+    def gen_token(self, *args, **kwargs):
+        return 42
+
+    with patch("salt.crypt.AsyncAuth.authenticated", False), patch(
+        "salt.crypt.AsyncAuth.authenticate", authenticate
+    ), patch("salt.crypt.AsyncAuth.gen_token", gen_token):
         yield
 
 
@@ -61,16 +58,12 @@ def _fake_crypticle():
         yield fake_crypticle
 
 
-@pytest.fixture
-def _squash_exepected_message_client_warning():
-    with warnings.catch_warnings():
-        warnings.filterwarnings(
-            "ignore",
-            message="MessageClient has been deprecated and will be removed.",
-            category=DeprecationWarning,
-            module="salt.transport.tcp",
-        )
-        yield
+# Applied through pytest's own per-test warnings handling instead of a fixture
+# which would snapshot and restore the warnings filters a second time.
+_squash_expected_message_client_warning = pytest.mark.filterwarnings(
+    "ignore:MessageClient has been deprecated and will be removed."
+    ":DeprecationWarning:salt.transport.tcp"
+)
 
 
 @attr.s(frozen=True, slots=True)
@@ -93,12 +86,28 @@ class ClientSocket:
         self.sock.close()
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def client_socket():
     with ClientSocket() as _client_socket:
         yield _client_socket
 
 
+def _closed_event(client):
+    """
+    Return an event which is set once the message client has finished closing
+    """
+    closed = asyncio.Event()
+    check_close = client.check_close
+
+    def _check_close():
+        check_close()
+        if client._closed:
+            closed.set()
+
+    client.check_close = _check_close
+    return closed
+
+
 def test_get_socket():
     socket = salt.transport.tcp._get_socket({"ipv6": True})
 
@@ -203,7 +212,7 @@ def test_tcppubserverpublisher_connect_ipv6():
     assert captured_family == [socket.AF_INET6]
 
 
-@pytest.mark.usefixtures("_squash_exepected_message_client_warning")
+@_squash_expected_message_client_warning
 async def test_message_client_cleanup_on_close(client_socket, temp_salt_master):
     """
     test message client cleanup on close
@@ -223,20 +232,19 @@ async def test_message_client_cleanup_on_close(client_socket, temp_salt_master):
     # Ensure we are testing the _read_until_future and io_loop teardown
     assert client._stream is not None
 
+    closed = _closed_event(client)
     client.close()
     assert client._closed is False
     assert client._closing is True
     assert client._stream is not None
-    await asyncio.sleep(0.1)
+    await asyncio.wait_for(closed.wait(), timeout=2)
 
     assert client._closed is True
     assert client._closing is False
     assert client._stream is None
 
 
-async def test_async_tcp_pub_channel_connect_publish_port(
-    temp_salt_master, client_socket
-):
+async def test_async_tcp_pub_channel_connect_publish_port(temp_salt_master):
     """
     test when publish_port is not 4506
     """
@@ -451,7 +459,7 @@ def salt_message_client(io_loop):
 #    assert message_id_2 not in salt_message_client.send_timeout_map
 
 
-@pytest.mark.usefixtures("_squash_exepected_message_client_warning")
+@_squash_expected_message_client_warning
 def test_timeout_message_unknown_future(salt_message_client):
     #    # test we don't fail on unknown message_id
     #    salt_message_client.timeout_message(-1, "message")
@@ -467,9 +475,11 @@ def test_timeout_message_unknown_future(salt_message_client):
     salt_message_client.timeout_message(message_id, "message")
 
     assert message_id not in salt_message_client.send_future_map
+    with pytest.raises(salt.exceptions.SaltReqTimeoutError):
+        future.result()
 
 
-@pytest.mark.usefixtures("_squash_exepected_message_client_warning")
+@_squash_expected_message_client_warning
 def xtest_client_reconnect_backoff(client_socket):
     opts = {"tcp_reconnect_backoff": 5}
 
@@ -557,15 +567,18 @@ async def test_mixin_should_use_correct_path_when_syndic():
         assert mock.call_args_list[0][0][0] == expected_pubkey_path
 
 
-@pytest.mark.usefixtures("_squash_exepected_message_client_warning")
+@_squash_expected_message_client_warning
 def test_presence_events_callback_passed(temp_salt_master, salt_message_client):
     opts = dict(temp_salt_master.config.copy(), transport="tcp", presence_events=True)
     channel = salt.channel.server.PubServerChannel.factory(opts)
     channel.transport = salt.transport.tcp.TCPPublishServer(opts)
     mock_publish_daemon = MagicMock()
+    aes_key = salt.crypt.Crypticle.generate_key_string()
+    secret = MagicMock()
+    secret.value = aes_key
     with patch(
         "salt.transport.tcp.TCPPublishServer.publish_daemon", mock_publish_daemon
-    ):
+    ), patch.dict(salt.master.SMaster.secrets, {"aes": {"secret": secret}}):
         channel._publish_daemon()
         mock_publish_daemon.assert_called_with(
             channel.publish_payload,
@@ -574,17 +587,26 @@ def test_presence_events_callback_passed(temp_salt_master, salt_message_client):
             secrets=None,
             started=None,
         )
+    assert channel.crypticle is not None
+    assert channel.crypticle.key_string == aes_key
+
+
+def test_publish_daemon_defers_crypticle_without_aes_secret(temp_salt_master):
+    opts = dict(temp_salt_master.config.copy(), transport="tcp")
+    channel = salt.channel.server.PubServerChannel.factory(opts)
+    channel.transport = salt.transport.tcp.TCPPublishServer(opts)
+    with patch("salt.transport.tcp.TCPPublishServer.publish_daemon"), patch.dict(
+        salt.master.SMaster.secrets, clear=True
+    ):
+        channel._publish_daemon()
+    assert channel.crypticle is None
 
 
 async def test_presence_removed_on_stream_closed():
     opts = {"presence_events": True}
 
-    io_loop_mock = MagicMock(spec=tornado.ioloop.IOLoop)
-    # Add asyncio_loop attribute for aioloop() compatibility
-    io_loop_mock.asyncio_loop = MagicMock()
-
     with patch("salt.master.AESFuncs.__init__", return_value=None):
-        server = salt.transport.tcp.PubServer(opts, io_loop=io_loop_mock)
+        server = salt.transport.tcp.PubServer(opts, io_loop=asyncio.get_running_loop())
         server._closing = True
         server.remove_presence_callback = MagicMock()
 
@@ -690,8 +712,10 @@ async def test_salt_message_server(master_opts):
     class Stream:
         def __init__(self, messages):
             self.messages = messages
+            self.reads = []
 
         def read_bytes(self, *args, **kwargs):
+            self.reads.append((args, kwargs))
             if self.messages:
                 msg = self.messages.pop(0)
                 future = tornado.concurrent.Future()
@@ -709,6 +733,10 @@ async def test_salt_message_server(master_opts):
 
     assert received
     assert [msg] == received
+    assert stream.reads[0] == (
+        (salt.transport.tcp._READ_CHUNK_SIZE,),
+        {"partial": True},
+    )
 
 
 async def test_salt_message_server_recreates_unpacker_on_disconnect(monkeypatch):
@@ -885,28 +913,30 @@ async def test_salt_message_server_exception(master_opts, io_loop):
     stream.close.assert_called_once()
 
 
-@pytest.mark.usefixtures("_squash_exepected_message_client_warning")
+@_squash_expected_message_client_warning
 async def test_message_client_stream_return_exception(minion_opts, io_loop):
     msg = {"foo": "bar"}
     payload = salt.transport.frame.frame_msg(msg)
     future = tornado.concurrent.Future()
     future.set_result(payload)
+    disconnected = asyncio.Event()
     client = salt.transport.tcp.MessageClient(
         minion_opts,
         "127.0.0.1",
         12345,
         connect_callback=MagicMock(),
-        disconnect_callback=MagicMock(),
+        disconnect_callback=disconnected.set,
     )
     client._stream = MagicMock()
     client._stream.read_bytes.side_effect = [
         future,
     ]
+    closed = _closed_event(client)
     try:
         io_loop.add_callback(client._stream_return)
-        await asyncio.sleep(0.01)
+        await asyncio.wait_for(disconnected.wait(), timeout=2)
         client.close()
-        await asyncio.sleep(0.01)
+        await asyncio.wait_for(closed.wait(), timeout=2)
         assert client._stream is None
     finally:
         client.close()
@@ -918,36 +948,140 @@ def test_tcp_pub_server_pre_fork(master_opts):
     server.pre_fork(process_manager)
 
 
+async def test_pub_server_handle_stream_sets_nodelay(master_opts, io_loop):
+    server = salt.transport.tcp.PubServer(master_opts, io_loop=io_loop)
+    stream = MagicMock()
+    try:
+        server.handle_stream(stream, ("127.0.0.1", 4506))
+        stream.set_nodelay.assert_called_once_with(True)
+        assert len(server.clients) == 1
+    finally:
+        server.close()
+
+
 async def test_pub_server_publish_payload(master_opts, io_loop):
     server = salt.transport.tcp.PubServer(master_opts, io_loop=io_loop)
     package = {"foo": "bar"}
     topic_list = ["meh"]
     future = tornado.concurrent.Future()
     future.set_result(None)
-    client = MagicMock()
-    client.stream = MagicMock()
-    client.stream.write.side_effect = [future]
+    stream = MagicMock()
+    stream.write.side_effect = [future]
+    client = salt.transport.tcp.Subscriber(stream, ("127.0.0.1", 4506))
     client.id_ = "meh"
-    server.clients = [client]
-    await server.publish_payload(package, topic_list)
-    client.stream.write.assert_called_once()
+    server.clients = {client}
+    try:
+        await server.publish_payload(package, topic_list)
+        stream.write.assert_called_once()
+    finally:
+        client.close()
+
+
+async def test_pub_server_publish_payload_topic_list(master_opts, io_loop):
+    server = salt.transport.tcp.PubServer(master_opts, io_loop=io_loop)
+    clients = {}
+    for id_ in ("minion01", "minion02", "minion03"):
+        future = tornado.concurrent.Future()
+        future.set_result(None)
+        stream = MagicMock()
+        stream.write.return_value = future
+        client = salt.transport.tcp.Subscriber(stream, ("127.0.0.1", 4506))
+        client.id_ = id_
+        clients[id_] = client
+    server.clients = set(clients.values())
+    try:
+        await server.publish_payload(
+            {"foo": "bar"}, ["minion01", "minion03", "minion01", "minion04"]
+        )
+        clients["minion01"].stream.write.assert_called_once()
+        clients["minion02"].stream.write.assert_not_called()
+        clients["minion03"].stream.write.assert_called_once()
+    finally:
+        for client in clients.values():
+            client.close()
 
 
 async def test_pub_server_publish_payload_closed_stream(master_opts, io_loop):
     server = salt.transport.tcp.PubServer(master_opts, io_loop=io_loop)
     package = {"foo": "bar"}
     topic_list = ["meh"]
-    client = MagicMock()
-    client.stream = MagicMock()
-    client.stream.write.side_effect = [
+    stream = MagicMock()
+    stream.write.side_effect = [
         tornado.iostream.StreamClosedError("mock"),
     ]
+    client = salt.transport.tcp.Subscriber(stream, ("127.0.0.1", 4506))
     client.id_ = "meh"
     server.clients = {client}
     await server.publish_payload(package, topic_list)
     assert server.clients == set()
 
 
+async def test_subscriber_write_coalesces_while_write_in_flight(io_loop):
+    first = tornado.concurrent.Future()
+    second = tornado.concurrent.Future()
+    stream = MagicMock()
+    stream.write.side_effect = [first, second]
+    client = salt.transport.tcp.Subscriber(stream, ("127.0.0.1", 4506))
+    try:
+        assert client.write(b"a") is first
+        pending = client.write(b"b")
+        assert client.write(b"c") is pending
+        stream.write.assert_called_once_with(b"a")
+
+        first.set_result(None)
+        await asyncio.sleep(0)
+        assert stream.write.call_args_list == [call(b"a"), call(b"bc")]
+        assert not pending.done()
+
+        second.set_result(None)
+        await asyncio.wait_for(pending, timeout=1)
+    finally:
+        client.close()
+
+
+async def test_subscriber_write_fails_queued_payloads_after_failed_write(io_loop):
+    first = tornado.concurrent.Future()
+    stream = MagicMock()
+    stream.write.side_effect = [first]
+    client = salt.transport.tcp.Subscriber(stream, ("127.0.0.1", 4506))
+    try:
+        client.write(b"a")
+        pending = client.write(b"b")
+
+        first.set_exception(tornado.iostream.StreamClosedError())
+        await asyncio.sleep(0)
+        stream.write.assert_called_once_with(b"a")
+        with pytest.raises(tornado.iostream.StreamClosedError):
+            await asyncio.wait_for(pending, timeout=1)
+    finally:
+        client.close()
+
+
+async def test_pub_server_publish_payload_sweeps_closed_streams(master_opts, io_loop):
+    remove_presence_callback = MagicMock()
+    server = salt.transport.tcp.PubServer(
+        master_opts,
+        io_loop=io_loop,
+        remove_presence_callback=remove_presence_callback,
+    )
+    future = tornado.concurrent.Future()
+    future.set_result(None)
+    open_stream = MagicMock()
+    open_stream.write.return_value = future
+    closed_stream = MagicMock()
+    closed_stream.write.side_effect = tornado.iostream.StreamClosedError("mock")
+    open_client = salt.transport.tcp.Subscriber(open_stream, ("127.0.0.1", 4506))
+    closed_client = salt.transport.tcp.Subscriber(closed_stream, ("127.0.0.1", 4507))
+    server.clients = {open_client, closed_client}
+    try:
+        await server.publish_payload({"foo": "bar"})
+        open_stream.write.assert_called_once()
+        assert server.clients == {open_client}
+        remove_presence_callback.assert_called_once_with(closed_client)
+    finally:
+        open_client.close()
+
+
 async def test_pub_server_paths_no_perms(master_opts, io_loop):
     def publish_payload(payload):
         return payload
@@ -418,3 +418,21 @@ async def test_await_lock_raises_when_lock_path_is_directory(tmp_path):
     with pytest.raises(salt.exceptions.FileLockError, match="not a file"):
         async with salt.utils.files.await_lock(lock_fn, lock_fn=lock_fn, timeout=1):
             pass
+
+
+@pytest.mark.skip_on_windows(reason="Ownership and mode are not replicated on Windows")
+def test_replacefile_keeps_mode_and_backs_up(tmp_path):
+    dest = tmp_path / "dest"
+    dest.write_text("old")
+    dest.chmod(0o640)
+    tgt = tmp_path / "tgt"
+    tgt.write_text("new")
+    cachedir = tmp_path / "cache"
+    with patch("salt.utils.files.backup_minion") as backup_minion:
+        salt.utils.files.replacefile(str(tgt), str(dest), "minion", str(cachedir))
+    backup_minion.assert_called_once_with(
+        str(dest), os.path.join(str(cachedir), "file_backup")
+    )
+    assert dest.read_text() == "new"
+    assert dest.stat().st_mode & 0o777 == 0o640
+    assert not tgt.exists()